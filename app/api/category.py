@@ -5,6 +5,8 @@ from sqlalchemy import or_
 
 from models.base import User, Category, Item, ItemCategory
 from utils.auth import authenticate
+from utils.ranking import next_rank
+from utils.trip_cache import invalidate_user_caches
 
 route = APIRouter()
 
@@ -25,8 +27,7 @@ def create(payload: CategoryType, user: User = Depends(authenticate)):
     except:
         raise HTTPException(400, "Unable to create category.")
 
-    position = db.session.query(
-        ItemCategory).filter_by(user_id=user.id).count()
+    position = next_rank(db.session, ItemCategory, [ItemCategory.user_id == user.id])
     item_category = ItemCategory(
         category_id=new_category.id, user_id=user.id, sort_order=position)
 
@@ -66,6 +67,8 @@ def update(category_id, payload: CategoryUpdateType, user: User = Depends(authen
     except Exception:
         raise HTTPException(400, "Unable to update category.")
 
+    invalidate_user_caches(user.id)
+
     return category
 
 
@@ -81,7 +84,7 @@ def delete(category_id, user: User = Depends(authenticate)):
         category_id=category.id, user_id=user.id).first()
 
     if item_category:
-        items = db.session.query(Item).filter_by(category_id=item_category, user_id=user.id).all()
+        items = db.session.query(Item).filter_by(category_id=item_category.id, user_id=user.id).all()
         for item in items:
             item.category_id = None
 
@@ -92,4 +95,6 @@ def delete(category_id, user: User = Depends(authenticate)):
         except Exception:
             raise HTTPException(400, "Unable to delete category.")
 
+        invalidate_user_caches(user.id)
+
     return True
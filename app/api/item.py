@@ -1,16 +1,25 @@
 import csv
 
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi_sqlalchemy import db
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, insert, select, update as sql_update
 from typing import List
 from io import StringIO
-from sqlalchemy import or_, func
+from tempfile import TemporaryFile
 
-from models.base import User, Item, ItemCategory, Category, Brand, Product, ProductVariant
+from models.base import User, Item, ItemCategory
 from utils.auth import authenticate
-from utils.weight import standardize_weight_unit
-from utils.item_category import get_or_create_item_category
+from utils.resolver import resolve_item_payloads
+from utils.jobs import job_store, release_import, reserve_import, submit_import
+from utils.export import export_response, user_items_query
+from utils.pagination import keyset_page, paginated
+from utils.etag import make_etag, not_modified
+from utils.ranking import move, set_sort_orders, spaced
+from utils.trip_cache import invalidate_user_caches
+from utils.importer import normalize_row, parse_rows, parse_lighterpack_row, parse_csv_row, import_entries, \
+    iter_csv_rows, stream_import
 
 route = APIRouter()
 
@@ -33,90 +42,23 @@ class ItemType(BaseModel):
     wishlist: bool = None
     notes: str = None
 
-# TODO functionize brand/product/category creation
+
+# Names resolved into ids rather than stored on the item
+CREATION_FIELDS = {"brand_new", "product_new",
+                   "product_variant_new", "category_new"}
 
 
 @route.post("")
 def create(payload: ItemType, user: User = Depends(authenticate)):
-    # If brand_new is provided, create a new brand
-    if payload.brand_new:
-        new_brand = payload.brand_new.strip()
-        existing_brand = db.session.query(Brand).filter(
-            func.lower(Brand.name) == new_brand.lower()).first()
-
-        if existing_brand:
-            payload.brand_id = existing_brand.id
-        else:
-            brand = Brand(name=new_brand)
-            db.session.add(brand)
-            db.session.commit()
-            db.session.refresh(brand)
-            payload.brand_id = brand.id
-
-    # If product_new is provided, create a new product and assign brand_id
-    if payload.product_new and payload.brand_id:
-        new_product = payload.product_new.strip()
-        existing_product = db.session.query(Product).filter(
-            func.lower(Product.name) == new_product.lower()).first()
-
-        if existing_product:
-            payload.product_id = existing_product.id
-        else:
-            product = Product(name=new_product, brand_id=payload.brand_id)
-            db.session.add(product)
-            db.session.commit()
-            db.session.refresh(product)
-            payload.product_id = product.id
-
-    if payload.product_variant_new and payload.product_id:
-        new_variant = payload.product_variant_new.strip()
-        existing_variant = db.session.query(ProductVariant).filter(
-            func.lower(ProductVariant.name) == new_variant.lower()).first()
-
-        if existing_variant:
-            payload.product_variant_id = existing_variant.id
-        else:
-            variant = ProductVariant(
-                name=new_variant, product_id=payload.product_id)
-            db.session.add(variant)
-            db.session.commit()
-            db.session.refresh(variant)
-            payload.product_variant_id = variant.id
-
-    # If category_new is provided, create a new category
-    if payload.category_new:
-        new_category = payload.category_new.strip()
-        existing_category = db.session.query(Category).filter(
-            func.lower(Category.name) == new_category.lower()).first()
-
-        if existing_category:
-            payload.category_id = existing_category.id
-        else:
-            category = Category(name=new_category, user_id=user.id)
-            db.session.add(category)
-            db.session.commit()
-            db.session.refresh(category)
-            payload.category_id = category.id
-
-    # Creates an item-specific category for the user
-    if payload.category_id:
-        payload.category_id = get_or_create_item_category(
-            db.session, payload.category_id, user.id)
-
-    # Remove data-creation fields from dict
-    item_data = payload.dict()
-    item_data.pop("product_new")
-    item_data.pop("product_variant_new")
-    item_data.pop("brand_new")
-    item_data.pop("category_new")
-
-    new_item = Item(user_id=user.id, **item_data)
-
     try:
+        # Resolves or creates brand/product/variant/category in the same transaction
+        resolve_item_payloads(db.session, [payload], user.id)
+        new_item = Item(user_id=user.id, **payload.dict(exclude=CREATION_FIELDS))
         db.session.add(new_item)
         db.session.commit()
     except Exception as e:
         print(e)
+        db.session.rollback()
         raise HTTPException(400, "Unable to create item.")
 
     return new_item
@@ -129,96 +71,121 @@ class ItemUpdate(ItemType):
 
 @route.put("")
 def update(payload: ItemUpdate, user: User = Depends(authenticate)):
-    # If brand_new is provided, create a new brand
-    if payload.brand_new:
-        new_brand = payload.brand_new.strip()
-        existing_brand = db.session.query(Brand).filter(
-            func.lower(Brand.name) == new_brand.lower()).first()
-
-        if existing_brand:
-            payload.brand_id = existing_brand.id
-        else:
-            brand = Brand(name=new_brand)
-            db.session.add(brand)
-            db.session.commit()
-            db.session.refresh(brand)
-            payload.brand_id = brand.id
-
-    # If product_new is provided, create a new product and assign brand_id
-    if payload.product_new and payload.brand_id:
-        new_product = payload.product_new.strip()
-        existing_product = db.session.query(Product).filter(
-            func.lower(Product.name) == new_product.lower()).first()
-
-        if existing_product:
-            payload.product_id = existing_product.id
-        else:
-            product = Product(name=new_product, brand_id=payload.brand_id)
-            db.session.add(product)
-            db.session.commit()
-            db.session.refresh(product)
-            payload.product_id = product.id
-
-    if payload.product_variant_new and payload.product_id:
-        new_variant = payload.product_variant_new.strip()
-        existing_variant = db.session.query(ProductVariant).filter(
-            func.lower(ProductVariant.name) == new_variant.lower()).first()
-
-        if existing_variant:
-            payload.product_variant_id = existing_variant.id
-        else:
-            variant = ProductVariant(
-                name=new_variant, product_id=payload.product_id)
-            db.session.add(variant)
-            db.session.commit()
-            db.session.refresh(variant)
-            payload.product_variant_id = variant.id
-
-    # If category_new is provided, create a new category
-    if payload.category_new:
-        new_category = payload.category_new.strip()
-        existing_category = db.session.query(Category).filter(
-            func.lower(Category.name) == new_category.lower()).first()
-
-        if existing_category:
-            payload.category_id = existing_category.id
-        else:
-            category = Category(name=new_category, user_id=user.id)
-            db.session.add(category)
-            db.session.commit()
-            db.session.refresh(category)
-            payload.category_id = category.id
-
-    if payload.category_id:
-        payload.category_id = get_or_create_item_category(
-            db.session, payload.category_id, user.id)
-
-    # Remove data-creation fields from dict
-    fields = payload.dict()
-    fields.pop("product_new")
-    fields.pop("product_variant_new")
-    fields.pop("brand_new")
-    fields.pop("category_new")
-
     item = db.session.query(Item).filter_by(
         id=payload.id, user_id=user.id).first()
 
     if not item:
         raise HTTPException(400, "Item not found.")
 
-    for key, value in fields.items():
-        setattr(item, key, value)
-
     try:
+        resolve_item_payloads(db.session, [payload], user.id)
+        for key, value in payload.dict(exclude=CREATION_FIELDS).items():
+            setattr(item, key, value)
+
         db.session.commit()
         db.session.refresh(item)
     except Exception as e:
         print(e)
+        db.session.rollback()
         raise HTTPException(400, "Unable to update item.")
 
+    invalidate_user_caches(user.id)
+
     return item
 
 
+MAX_BATCH_SIZE = 500
+
+
+class ItemOperation(BaseModel):
+    op: str
+    id: int = None
+    item: dict = None
+
+
+class ItemOperations(BaseModel):
+    __root__: List[ItemOperation]
+
+    def __iter__(self):
+        return iter(self.__root__)
+
+
+@route.post("s/batch")
+def batch(operations: ItemOperations, user: User = Depends(authenticate)):
+    if len(operations.__root__) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"A batch can hold at most {MAX_BATCH_SIZE} operations.")
+
+    results = []
+    creates = []
+    updates = []
+    deletes = []
+
+    # Validate each operation with the same models as the single-item endpoints
+    for i, operation in enumerate(operations):
+        results.append({'op': operation.op, 'success': True, 'id': operation.id})
+        try:
+            if operation.op == 'create':
+                creates.append((i, ItemType.parse_obj(operation.item or {})))
+            elif operation.op == 'update':
+                data = dict(operation.item or {})
+                if operation.id is not None:
+                    data['id'] = operation.id
+                payload = ItemUpdate.parse_obj(data)
+                results[i]['id'] = payload.id
+                updates.append((i, payload))
+            elif operation.op == 'delete':
+                if operation.id is None:
+                    raise ValueError("Item id is required.")
+                deletes.append((i, operation.id))
+            else:
+                raise ValueError("Operation must be one of: create, update, delete")
+        except (ValidationError, ValueError) as e:
+            results[i].update(success=False, error=str(e))
+
+    # Updates and deletes only apply to the user's own items
+    item_ids = [p.id for _, p in updates] + [item_id for _, item_id in deletes]
+    owned = set(db.session.scalars(select(Item.id).where(
+        Item.user_id == user.id, Item.id.in_(item_ids)))) if item_ids else set()
+
+    for i, item_id in [(i, p.id) for i, p in updates] + deletes:
+        if item_id not in owned:
+            results[i].update(success=False, error="Item not found.")
+
+    updates = [(i, p) for i, p in updates if results[i]['success']]
+    deletes = [(i, item_id) for i, item_id in deletes if results[i]['success']]
+
+    try:
+        resolve_item_payloads(
+            db.session, [p for _, p in creates + updates], user.id)
+
+        if creates:
+            new_ids = db.session.scalars(
+                insert(Item).returning(Item.id, sort_by_parameter_order=True),
+                [dict(p.dict(exclude=CREATION_FIELDS), user_id=user.id) for _, p in creates])
+            for (i, _), new_id in zip(creates, new_ids):
+                results[i]['id'] = new_id
+
+        if updates:
+            db.session.execute(sql_update(Item), [
+                dict(p.dict(exclude=CREATION_FIELDS, exclude_unset=True), id=p.id)
+                for _, p in updates])
+
+        if deletes:
+            db.session.execute(sql_update(Item).where(
+                Item.user_id == user.id,
+                Item.id.in_([item_id for _, item_id in deletes])).values(removed=True))
+
+        db.session.commit()
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(400, "Unable to apply item changes.")
+
+    invalidate_user_caches(user.id)
+
+    return results
+
+
 class ItemOrder(BaseModel):
     id: int
     sort_order: int
@@ -233,11 +200,10 @@ class SortItems(BaseModel):
 
 @route.put("/sort")
 def sort_items(items: SortItems, user: User = Depends(authenticate)):
-    item_mappings = [dict(id=item.id, user_id=user.id, sort_order=item.sort_order)
-                     for item in items]
+    item_orders = [(item.id, item.sort_order) for item in items]
 
     try:
-        db.session.bulk_update_mappings(Item, item_mappings)
+        set_sort_orders(db.session, Item, [Item.user_id == user.id], spaced(item_orders))
         db.session.commit()
     except Exception as e:
         print(e)
@@ -249,27 +215,90 @@ def sort_items(items: SortItems, user: User = Depends(authenticate)):
 
 @route.put("/category/sort")
 def sort_items(categories: SortItems, user: User = Depends(authenticate)):
-    item_category_mappings = [dict(id=category.id, user_id=user.id, sort_order=category.sort_order)
-                              for category in categories]
+    item_category_orders = [(category.id, category.sort_order)
+                            for category in categories]
 
     try:
-        db.session.bulk_update_mappings(ItemCategory, item_category_mappings)
+        set_sort_orders(db.session, ItemCategory, [
+                        ItemCategory.user_id == user.id], spaced(item_category_orders))
         db.session.commit()
     except Exception as e:
         print(e)
         raise HTTPException(
             400, "An error occurred while updating category order.")
 
+    invalidate_user_caches(user.id)
     return True
 
 
+class MoveType(BaseModel):
+    id: int
+    after_id: int = None
+    before_id: int = None
+
+
+@route.put("/move")
+def move_item(payload: MoveType, user: User = Depends(authenticate)):
+    try:
+        sort_order = move(db.session, Item, [Item.user_id == user.id, Item.removed == False],
+                          payload.id, after_id=payload.after_id, before_id=payload.before_id)
+        db.session.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(
+            400, "An error occurred while updating item order.")
+
+    return {"id": payload.id, "sort_order": sort_order}
+
+
+@route.put("/category/move")
+def move_category(payload: MoveType, user: User = Depends(authenticate)):
+    try:
+        sort_order = move(db.session, ItemCategory, [ItemCategory.user_id == user.id],
+                          payload.id, after_id=payload.after_id, before_id=payload.before_id)
+        db.session.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(
+            400, "An error occurred while updating category order.")
+
+    invalidate_user_caches(user.id)
+    return {"id": payload.id, "sort_order": sort_order}
+
+
 @route.get("s")
-def fetch(user: User = Depends(authenticate)):
+def fetch(request: Request, response: Response, cursor: str = None, limit: int = None, fields: str = None,
+          user: User = Depends(authenticate)):
+    # Removing an item bumps its updated_at, so the max covers removed rows too
+    count, last_modified = db.session.execute(select(
+        func.count(Item.id).filter(Item.removed == False),
+        func.max(Item.updated_at)).where(Item.user_id == user.id)).one()
+    etag = make_etag(request.url.query, user.id, count, last_modified)
+    cached = not_modified(request, response, etag, last_modified)
+    if cached:
+        return cached
+
+    if paginated(cursor, limit, fields):
+        return keyset_page(db.session, Item, [Item.user_id == user.id, Item.removed == False],
+                           [Item.id], cursor=cursor, limit=limit, fields=fields)
+
     items = db.session.query(Item).filter_by(
         user_id=user.id, removed=False).all()
     return items
 
 
+@route.get("s/export")
+def export(format: str = "packstack", user: User = Depends(authenticate)):
+    return export_response(db.session.get_bind(), user_items_query(user.id),
+                           format, "packstack-items")
+
+
 @route.delete("/{item_id}")
 def remove(item_id, user: User = Depends(authenticate)):
     item = db.session.query(Item).filter_by(
@@ -278,297 +307,108 @@ def remove(item_id, user: User = Depends(authenticate)):
 
     db.session.commit()
     db.session.refresh(item)
+    invalidate_user_caches(user.id)
 
     return item
 
 
 @route.post("/import/lighterpack")
-async def import_lighterpack_items(file: UploadFile = File(...), user: User = Depends(authenticate)):
+async def import_lighterpack_items(file: UploadFile = File(...), stream: bool = False, background: bool = False,
+        user: User = Depends(authenticate)):
+    if background:
+        return await queue_import(file, 'lighterpack', parse_lighterpack_row, user)
+
+    if stream:
+        return await run_in_threadpool(stream_rows, file, parse_lighterpack_row, user)
+
+    contents = await file.read()
+    return import_rows(read_csv(contents), parse_lighterpack_row, user)
+
+
+@route.post("/import/csv")
+async def import_items(file: UploadFile = File(...), stream: bool = False, background: bool = False,
+        user: User = Depends(authenticate)):
+    if background:
+        return await queue_import(file, 'csv', parse_csv_row, user)
+
+    if stream:
+        return await run_in_threadpool(stream_rows, file, parse_csv_row, user)
+
     contents = await file.read()
-    decoded = contents.decode()
-    buffer = StringIO(decoded)
+    return import_rows(read_csv(contents), parse_csv_row, user)
+
+
+@route.get("/import/{job_id}")
+def fetch_import_job(job_id, user: User = Depends(authenticate)):
+    job = job_store.get(job_id)
+
+    if not job or job['user_id'] != user.id:
+        raise HTTPException(400, "Import job not found.")
+
+    return job
+
+
+async def queue_import(file, kind, parse_row, user):
+    # Turn the import away before spooling anything when too many are pending
+    reserve_import(user.id)
+
+    # The upload is closed once the request ends, so copy it for the worker
+    spool = TemporaryFile()
+    try:
+        while chunk := await file.read(1024 * 1024):
+            spool.write(chunk)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        release_import(user.id)
+        raise
+
+    job = await run_in_threadpool(submit_import, user.id, kind, spool, parse_row)
+    return {'job_id': job['id'], 'status': job['status']}
+
+
+def read_csv(contents):
+    buffer = StringIO(contents.decode())
     csvReader = csv.DictReader(buffer)
 
     # Convert to lowercase and strip whitespace
-    rows = [dict((k.lower().strip(), v.strip())
-                 for k, v in row.items() if k) for row in csvReader]
+    rows = [normalize_row(row) for row in csvReader]
     buffer.close()
+    return rows
 
-    def generate_error(line, message):
-        return dict({'line': line + 2, 'error': message})
-
-    entries = []
-    errors = []
-    for i, row in enumerate(rows):
-        name = row.get("item name")
-        category = row.get("category")
-        description = row.get("desc")
-        weight = row.get("weight")
-        unit = row.get("unit")
-        product_url = row.get("url")
-        price = row.get("price", None)
-        consumable = row.get("consumable", None)
-
-        if not name:
-            continue
-
-        if unit:
-            try:
-                unit = standardize_weight_unit(unit)
-            except Exception as e:
-                errors.append(generate_error(i, str(e)))
-                continue
-
-        if weight:
-            try:
-                weight = float(weight)
-            except Exception as e:
-                errors.append(generate_error(i, "Invalid weight value."))
-                continue
-        else:
-            weight = None
-
-        if price:
-            try:
-                price = float(price)
-            except Exception as e:
-                errors.append(generate_error(i, "Invalid price value."))
-                continue
-        else:
-            price = None
-
-        category_id = None
-        if category:
-            # Retrieve user categories & generic categories
-            categories = db.session.query(Category).filter(
-                or_(Category.user_id == user.id, Category.user_id == None)).all()
-            category_id = next(
-                (cat.id for cat in categories if cat.name.lower() == category.lower()), None)
-
-            if category_id:
-                item_category_entity = db.session.query(ItemCategory.id).filter(
-                    ItemCategory.category_id == category_id, ItemCategory.user_id == user.id).first()
-
-                if item_category_entity:
-                    category_id = item_category_entity[0]
-
-                else:
-                    new_item_category = ItemCategory(
-                        user_id=user.id, category_id=category_id)
-                    try:
-                        db.session.add(new_item_category)
-                        db.session.commit()
-                        db.session.refresh(new_item_category)
-                        category_id = new_item_category.id
-                    except Exception as e:
-                        category_id = None
-                        db.session.rollback()
 
-            else:
-                new_category = Category(name=category, user_id=user.id)
-                try:
-                    db.session.add(new_category)
-                    db.session.commit()
-                    db.session.refresh(new_category)
-
-                    new_item_category = ItemCategory(
-                        user_id=user.id, category_id=new_category.id)
-                    db.session.add(new_item_category)
-                    db.session.commit()
-                    db.session.refresh(new_item_category)
-                    category_id = new_item_category.id
-
-                except Exception as e:
-                    print(e)
-                    category_id = None
-                    db.session.rollback()
-
-        entries.append(dict(user_id=user.id,
-                            category_id=category_id,
-                            name=name,
-                            weight=weight,
-                            unit=unit,
-                            price=price,
-                            product_url=product_url,
-                            notes=description,
-                            consumable=bool(consumable)))
+def import_rows(rows, parse_row, user):
+    entries, errors = parse_rows(rows, parse_row)
 
     if errors:
         return {'success': False, 'errors': errors, 'count': len(errors)}
 
     try:
-        db.session.bulk_insert_mappings(Item, entries)
+        count = import_entries(db.session, user.id, entries)
         db.session.commit()
     except Exception as e:
+        print(e)
         db.session.rollback()
         raise HTTPException(
             400, 'An unexpected error occurred while importing items.')
 
-    return {'success': True, 'errors': [], 'count': len(entries)}
-
-
-@route.post("/import/csv")
-async def import_items(file: UploadFile = File(...), user: User = Depends(authenticate)):
-    contents = await file.read()
-    decoded = contents.decode()
-    buffer = StringIO(decoded)
-    csvReader = csv.DictReader(buffer)
-
-    # Convert to lowercase and strip whitespace
-    rows = [dict((k.lower().strip(), v.strip())
-                 for k, v in row.items() if k) for row in csvReader]
-    buffer.close()
-
-    def generate_error(line, message):
-        return dict({'line': line + 2, 'error': message})
-
-    entries = []
-    errors = []
-    for i, row in enumerate(rows):
-        name = row.get("name")
-        brand = row.get("manufacturer")
-        product = row.get("product")
-        category = row.get("category")
-        weight = row.get("weight")
-        unit = row.get("unit")
-        product_url = row.get("product_url")
-        price = row.get("price", None)
-        consumable = row.get("consumable", None)
-        notes = row.get("notes", None)
-
-        if not name:
-            continue
-
-        if unit:
-            try:
-                unit = standardize_weight_unit(unit)
-            except Exception as e:
-                errors.append(generate_error(i, str(e)))
-                continue
-
-        if weight:
-            try:
-                weight = float(weight)
-            except Exception as e:
-                errors.append(generate_error(i, "Invalid weight value."))
-                continue
-        else:
-            weight = None
-
-        if price:
-            try:
-                price = float(price)
-            except Exception as e:
-                errors.append(generate_error(i, "Invalid price value."))
-                continue
-        else:
-            price = None
-
-        brand_id = None
-        if brand:
-            brand_entity = db.session.query(
-                Brand.id).filter(func.lower(Brand.name) == brand.lower()).first()
-
-            if brand_entity:
-                brand_id = brand_entity[0]
+    return {'success': True, 'errors': [], 'count': count}
 
-            else:
-                new_brand = Brand(name=brand)
-                try:
-                    db.session.add(new_brand)
-                    db.session.commit()
-                    db.session.refresh(new_brand)
-                    brand_id = new_brand.id
-                except Exception:
-                    brand_id = None
-                    db.session.rollback()
-
-        product_id = None
-        if brand_id and product:
-            product_entity = db.session.query(Product.id).filter(
-                func.lower(Product.name) == product, Product.brand_id == brand_id).first()
-
-            if product_entity:
-                product_id = product_entity[0]
-
-            else:
-                new_product = Product(brand_id=brand_id, name=product)
-                try:
-                    db.session.add(new_product)
-                    db.session.commit()
-                    db.session.refresh(new_product)
-                    product_id = new_product.id
-                except Exception:
-                    product_id = None
-                    db.session.rollback()
-
-        category_id = None
-        if category:
-            # Retrieve user categories & generic categories
-            categories = db.session.query(Category).filter(
-                or_(Category.user_id == user.id, Category.user_id == None)).all()
-            category_id = next(
-                (cat.id for cat in categories if cat.name.lower() == category.lower()), None)
-
-            if category_id:
-                item_category_entity = db.session.query(ItemCategory.id).filter(
-                    ItemCategory.category_id == category_id, ItemCategory.user_id == user.id).first()
-
-                if item_category_entity:
-                    category_id = item_category_entity[0]
-
-                else:
-                    new_item_category = ItemCategory(
-                        user_id=user.id, category_id=category_id)
-                    try:
-                        db.session.add(new_item_category)
-                        db.session.commit()
-                        db.session.refresh(new_item_category)
-                        category_id = new_item_category.id
-                    except Exception as e:
-                        category_id = None
-                        db.session.rollback()
 
-            else:
-                new_category = Category(name=category, user_id=user.id)
-                try:
-                    db.session.add(new_category)
-                    db.session.commit()
-                    db.session.refresh(new_category)
-
-                    new_item_category = ItemCategory(
-                        user_id=user.id, category_id=new_category.id)
-                    db.session.add(new_item_category)
-                    db.session.commit()
-                    db.session.refresh(new_item_category)
-                    category_id = new_item_category.id
-
-                except Exception as e:
-                    print(e)
-                    category_id = None
-                    db.session.rollback()
-
-        entries.append(dict(user_id=user.id,
-                            brand_id=brand_id,
-                            product_id=product_id,
-                            category_id=category_id,
-                            name=name,
-                            weight=weight,
-                            unit=unit,
-                            price=price,
-                            product_url=product_url,
-                            notes=notes,
-                            consumable=bool(consumable)))
+def stream_rows(file, parse_row, user):
+    try:
+        count, errors, error_count = stream_import(
+            db.session, user.id, iter_csv_rows(file.file), parse_row)
 
-    if errors:
-        return {'success': False, 'errors': errors, 'count': len(errors)}
+        if errors:
+            db.session.rollback()
+            return {'success': False, 'errors': errors, 'count': error_count}
 
-    try:
-        db.session.bulk_insert_mappings(Item, entries)
         db.session.commit()
     except Exception as e:
+        print(e)
         db.session.rollback()
         raise HTTPException(
             400, 'An unexpected error occurred while importing items.')
 
-    return {'success': True, 'errors': [], 'count': len(entries)}
+    return {'success': True, 'errors': [], 'count': count}
@@ -1,32 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi_sqlalchemy import db
 from pydantic import BaseModel
-from typing import List
+from sqlalchemy import case, select, update
+from typing import List, Optional
 
 from models.base import User, Pack, PackItem, Trip
 from utils.auth import authenticate
+from utils.export import export_response, pack_items_query
+from utils.pagination import keyset_page, paginated
+from utils.etag import make_etag, not_modified, packs_version
+from utils.sync import touch_pack
+from utils.pack import insert_pack_items, sync_pack_items, pack_summary, summary_cache, compare_packs, \
+    clone_packs
+from utils.trip_cache import invalidate_pack_caches, invalidate_trip_info
+from utils.weight import preferred_unit, standardize_weight_unit
+from utils.schemas import PackSchema, pack_loader_options
 
 route = APIRouter()
 
 
 @route.get("s")
-def get_user_packs(user: User = Depends(authenticate)):
-    user_packs = db.session.query(Pack).filter_by(user_id=user.id).all()
-    return user_packs
-
-
-@route.get("/trip/{trip_id}")
+def get_user_packs(request: Request, response: Response, cursor: str = None, limit: int = None,
+                   fields: str = None, user: User = Depends(authenticate)):
+    count, last_modified, *versions = db.session.execute(select(*packs_version(user.id))).one()
+    etag = make_etag(request.url.query, user.id, count, last_modified, *versions)
+    cached = not_modified(request, response, etag)
+    if cached:
+        return cached
+
+    if paginated(cursor, limit, fields):
+        page = keyset_page(db.session, Pack, [Pack.user_id == user.id], [Pack.id],
+                           cursor=cursor, limit=limit, fields=fields, options=pack_loader_options())
+        if not fields:
+            page["data"] = [PackSchema.from_orm(pack) for pack in page["data"]]
+        return page
+
+    user_packs = db.session.query(Pack).options(
+        *pack_loader_options()).filter_by(user_id=user.id).all()
+    return [PackSchema.from_orm(pack) for pack in user_packs]
+
+
+@route.get("/trip/{trip_id}", response_model=List[PackSchema])
 def get_trip_packs(trip_id):
-    trip_packs = db.session.query(Pack).filter_by(trip_id=trip_id).all()
+    trip_packs = db.session.query(Pack).options(
+        *pack_loader_options()).filter_by(trip_id=trip_id).all()
     return trip_packs
 
 
-@route.get("/{id}")
+@route.get("/compare")
+def compare(a: int, b: int, unit: str = None):
+    packs = db.session.query(Pack.id, User.unit_weight).join(
+        User, User.id == Pack.user_id).filter(Pack.id.in_([a, b])).all()
+    if len({pack.id for pack in packs}) < len({a, b}):
+        raise HTTPException(400, "Pack does not exist.")
+
+    if unit:
+        try:
+            unit = standardize_weight_unit(unit)
+        except Exception as e:
+            raise HTTPException(400, str(e))
+    else:
+        unit = preferred_unit(next(p for p in packs if p.id == a).unit_weight)
+
+    return compare_packs(db.session, a, b, unit)
+
+
+@route.get("/{id}", response_model=Optional[PackSchema])
 def get_trip_packs(id):
-    pack = db.session.query(Pack).filter_by(id=id).first()
+    pack = db.session.query(Pack).options(
+        *pack_loader_options()).filter_by(id=id).first()
     return pack
 
 
+@route.get("/{id}/export")
+def export_pack(id, format: str = "packstack"):
+    pack = db.session.query(Pack.id).filter_by(id=id).first()
+    if not pack:
+        raise HTTPException(400, "Pack does not exist.")
+
+    return export_response(db.session.get_bind(), pack_items_query(pack.id),
+                           format, f"packstack-pack-{pack.id}")
+
+
+@route.get("/{id}/summary")
+def get_pack_summary(id):
+    pack = db.session.query(Pack.id, Pack.user_id, User.unit_weight).join(
+        User, User.id == Pack.user_id).filter(Pack.id == id).first()
+    if not pack:
+        raise HTTPException(400, "Pack does not exist.")
+
+    unit = preferred_unit(pack.unit_weight)
+    summary = summary_cache.get((pack.user_id, pack.id))
+    if not summary or summary["unit"] != unit:
+        summary = pack_summary(db.session, pack.id, unit)
+        summary_cache.set((pack.user_id, pack.id), summary)
+
+    return summary
+
+
 class PackItemType(BaseModel):
     item_id: int
     quantity: float = None
@@ -47,28 +118,17 @@ def create_pack(pack: PackType, user: User = Depends(authenticate)):
 
     try:
         db.session.add(new_pack)
+        db.session.flush()
+        insert_pack_items(db.session, new_pack.id, pack.items)
         db.session.commit()
         db.session.refresh(new_pack)
     except Exception as e:
         print(e)
+        db.session.rollback()
         raise HTTPException(400, "An error occurred while creating pack.")
 
-    for item in pack.items:
-        new_item = PackItem(pack_id=new_pack.id,
-                            item_id=item.item_id,
-                            quantity=item.quantity,
-                            worn=item.worn,
-                            checked=item.checked,
-                            sort_order=item.sort_order)
-
-        db.session.add(new_item)
-
-    try:
-        db.session.commit()
-        db.session.refresh(new_pack)
-    except Exception as e:
-        print(e)
-        raise HTTPException(400, "An error occurred while adding pack items.")
+    if new_pack.trip_id:
+        invalidate_trip_info(trip_id=new_pack.trip_id)
 
     return new_pack
 
@@ -83,31 +143,46 @@ def update_pack(id, payload: PackType, user: User = Depends(authenticate)):
     try:
         pack.title = payload.title
         pack.trip_id = payload.trip_id
-        db.session.query(PackItem).filter_by(pack_id=pack.id).delete()
+
+        # Items are left untouched when the payload omits them
+        if payload.items is not None:
+            sync_pack_items(db.session, pack.id, payload.items)
+            touch_pack(db.session, pack.id)
+
         db.session.commit()
+        db.session.refresh(pack)
     except Exception as e:
         print(e)
+        db.session.rollback()
         raise HTTPException(
             400, "An error occurred while updating pack items.")
 
-    for item in payload.items:
-        new_item = PackItem(pack_id=pack.id,
-                            item_id=item.item_id,
-                            quantity=item.quantity,
-                            worn=item.worn,
-                            checked=item.checked,
-                            sort_order=item.sort_order)
+    invalidate_pack_caches(user.id, pack.id)
+
+    return pack
 
-        db.session.add(new_item)
+
+@route.post("/{id}/clone", response_model=PackSchema)
+def clone_pack(id, user: User = Depends(authenticate)):
+    pack = db.session.query(Pack).filter_by(
+        user_id=user.id, id=id).first()
+    if not pack:
+        raise HTTPException(400, "Pack does not exist.")
 
     try:
+        cloned = clone_packs(db.session, [Pack.id == pack.id],
+                             title=f"{pack.title} (Copy)")
         db.session.commit()
-        db.session.refresh(pack)
     except Exception as e:
         print(e)
-        raise HTTPException(400, "An error occurred while adding pack items.")
+        db.session.rollback()
+        raise HTTPException(400, "An error occurred while cloning pack.")
 
-    return pack
+    if pack.trip_id:
+        invalidate_trip_info(trip_id=pack.trip_id)
+
+    return db.session.query(Pack).options(
+        *pack_loader_options()).filter_by(id=cloned[pack.id]).first()
 
 
 class PackItemToggle(BaseModel):
@@ -124,15 +199,68 @@ def update_pack_item(pack_id, item_id, payload: PackItemToggle, user: User = Dep
 
     try:
         item.checked = payload.checked
+        touch_pack(db.session, item.pack_id)
         db.session.commit()
     except Exception as e:
         raise HTTPException(400, "An error occurred while updating pack item.")
 
+    invalidate_pack_caches(user.id, item.pack_id)
+
     return True
 
 
+class ChecklistChange(BaseModel):
+    item_id: int
+    checked: bool
+
+
+class Checklist(BaseModel):
+    all: bool = None
+    items: List[ChecklistChange] = []
+
+
+@route.put("/{pack_id}/checklist")
+def update_checklist(pack_id, payload: Checklist, user: User = Depends(authenticate)):
+    pack = db.session.query(Pack.id).filter_by(
+        id=pack_id, user_id=user.id).first()
+
+    if not pack:
+        raise HTTPException(400, "Pack does not exist.")
+
+    # Later changes to the same item win, as if applied one by one
+    changes = {change.item_id: change.checked for change in payload.items}
+    if payload.all is None and not changes:
+        return {"updated": 0}
+
+    # "Check all"/"uncheck all" and individual ticks share one UPDATE
+    otherwise = PackItem.checked if payload.all is None else payload.all
+    stmt = update(PackItem).where(PackItem.pack_id == pack.id)
+    if payload.all is None:
+        stmt = stmt.where(PackItem.item_id.in_(list(changes)))
+    checked = case(changes, value=PackItem.item_id,
+                   else_=otherwise) if changes else payload.all
+
+    try:
+        result = db.session.execute(stmt.values(checked=checked)
+                                    .execution_options(synchronize_session=False))
+        touch_pack(db.session, pack.id)
+        db.session.commit()
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(400, "An error occurred while updating pack items.")
+
+    invalidate_pack_caches(user.id, pack.id)
+
+    return {"updated": result.rowcount}
+
+
 @route.get("/legacy/unassigned")
-def get_unassigned_packs(user: User = Depends(authenticate)):
+def get_unassigned_packs(cursor: str = None, limit: int = None, fields: str = None, user: User = Depends(authenticate)):
+    if paginated(cursor, limit, fields):
+        return keyset_page(db.session, Pack, [Pack.user_id == user.id, Pack.trip_id == None], [Pack.id],
+                           cursor=cursor, limit=limit, fields=fields)
+
     unassigned_packs = db.session.query(Pack).filter_by(
         user_id=user.id, trip_id=None).all()
 
@@ -185,6 +313,8 @@ def assign_pack(pack_id, payload: AssignPack, user: User = Depends(authenticate)
     except Exception as e:
         raise HTTPException(400, "An error occurred while assigning pack.")
 
+    invalidate_pack_caches(user.id, pack.id)
+
     return pack
 
 
@@ -202,4 +332,6 @@ def delete_pack(pack_id, user: User = Depends(authenticate)):
     except Exception as e:
         raise HTTPException(400, "An error occurred while deleting pack.")
 
+    invalidate_pack_caches(user.id, pack_id)
+
     return True
@@ -1,23 +1,34 @@
 import csv
 import statistics
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi_sqlalchemy import db
 from pydantic import BaseModel
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
 from models.base import Brand, Condition, Geography, Product, User, Category, Item, ProductVariant
 from utils.auth import authenticate
 from utils.digital_ocean import s3_client
-from utils.weight import convert_weight
+from utils.pagination import keyset_page, paginated
+from utils.etag import make_etag, not_modified
+from utils.weight import convert_weight, preferred_unit
 from seed.categories import default_categories
 
 route = APIRouter()
 
 
 @route.get("")
-def fetch():
+def fetch(request: Request, response: Response):
+    # Reference rows are only ever added or removed, so counts and highest ids cover every change
+    versions = db.session.execute(select(
+        *[select(aggregate(model.id)).scalar_subquery()
+          for model in (Condition, Geography) for aggregate in (func.count, func.max)])).one()
+    cached = not_modified(request, response, make_etag(*versions))
+    if cached:
+        return cached
+
     conditions = db.session.query(Condition).all()
     geographies = db.session.query(Geography).all()
 
@@ -56,7 +67,11 @@ def create_brand(payload: CreateBrand, user: User = Depends(authenticate)):
 
 
 @route.get("/brands")
-def fetch_brands():
+def fetch_brands(cursor: str = None, limit: int = None, fields: str = None):
+    if paginated(cursor, limit, fields):
+        return keyset_page(db.session, Brand, [Brand.removed == False], [Brand.name, Brand.id],
+                           cursor=cursor, limit=limit, fields=fields)
+
     brands = db.session.query(Brand).filter_by(removed=False).all()
     return brands
 
@@ -112,7 +127,7 @@ class ProductDetails(BaseModel):
 
 @route.post("/product-details")
 def fetch_product_details(payload: ProductDetails, user: User = Depends(authenticate)):
-    conversion_unit = "g" if user.unit_weight == "METRIC" else "oz"
+    conversion_unit = preferred_unit(user.unit_weight)
     items = db.session.query(Item).filter(
         Item.brand_id == payload.brandId, Item.product_id == payload.productId).all()
 
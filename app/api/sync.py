@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+from fastapi_sqlalchemy import db
+
+from models.base import User
+from utils.auth import authenticate
+from utils.sync import fetch_changes, issue_token, token_time
+
+route = APIRouter()
+
+
+@route.get("")
+def sync(since: str = None, user: User = Depends(authenticate)):
+    # Issue the next token before reading so concurrent writes aren't skipped
+    token = issue_token()
+    changes = fetch_changes(db.session, user.id, token_time(since))
+
+    return {
+        "token": token,
+        "full": since is None,
+        **changes
+    }
@@ -1,53 +1,81 @@
 import datetime
 
-from io import BytesIO
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi_sqlalchemy import db
 from pydantic import BaseModel
 from typing import List
+from sqlalchemy import func, select
 from sqlalchemy.orm import joinedload
-from PIL import Image as PILImage, ImageOps
 
-from models.base import User, Trip, Image, TripGeography, TripCondition, Pack, PackItem
+from models.base import User, Trip, Image, TripGeography, TripCondition, Pack
 from utils.auth import authenticate
-from utils.digital_ocean import s3_file_upload, s3_file_delete
+from utils.uploads import claim_upload, pending_s3, presign_upload, queue_processing
+from utils.storage import enqueue_deletion, notify_storage_gc
+from utils.assets import release_images, store_image
 from utils.utils import clone_model
+from utils.pagination import keyset_page, paginated, page_size
+from utils.feed import feed_page
+from utils.sitemap import SITEMAP_CHUNK_SIZE, chunk_response, sitemap_index
+from utils.sync import touch_trip
+from utils.trip_cache import info_cache, invalidate_trip_caches, invalidate_trip_info
+from utils.ranking import move, next_rank, set_sort_orders, spaced
+from utils.pack import clone_packs
+from utils.schemas import PackSchema, pack_loader_options
+from utils.etag import make_etag, not_modified, packs_version
 
 route = APIRouter()
 
 
 @route.get("")
-def fetch():
-    now = datetime.datetime.utcnow()
-    trips = db.session.query(Trip).filter(
-        Trip.end_date != None,
-        Trip.end_date <= now,
-        Trip.removed == False,
-        Trip.published == True
-    ).order_by(Trip.end_date.desc()).limit(35).all()
-
-    return trips
+def fetch(cursor: str = None, limit: int = None):
+    trips, next_cursor = feed_page(db.session, cursor=cursor, limit=limit)
 
+    if cursor is None and limit is None:
+        return trips
 
-@route.get("/info/{trip_id}")
-def fetch_info(trip_id):
-    trip = db.session.query(Trip).filter_by(uuid=trip_id).first()
+    return {"data": trips, "next_cursor": next_cursor, "limit": page_size(limit)}
 
-    # fetch pack owner's info
-    user = db.session.query(User.username,
-                            User.unit_distance,
-                            User.unit_temperature,
-                            User.unit_weight).filter_by(id=trip.user_id).first()._asdict()
 
-    if not trip:
+@route.get("/info/{trip_id}")
+def fetch_info(trip_id, request: Request, response: Response):
+    cached = info_cache.get(trip_id)
+    if cached:
+        return not_modified(request, response, cached["etag"]) or cached["payload"]
+
+    # Trip, owner's info and the packs' validators in one query. Image, condition
+    # and geography writes bump the trip's updated_at.
+    owner = [User.username, User.unit_distance, User.unit_temperature, User.unit_weight]
+    row = db.session.execute(
+        select(Trip, *owner, *packs_version(Trip.user_id, Pack.trip_id == Trip.id))
+        .join(User, User.id == Trip.user_id)
+        .where(Trip.uuid == trip_id)).first()
+
+    if not row:
         raise HTTPException(400, "Trip not found.")
 
-    packs = db.session.query(Pack).filter_by(trip_id=trip.id).all()
-    return {
+    trip, *values = row
+    user = {column.key: value for column, value in zip(owner, values)}
+    etag = make_etag(trip.id, trip.updated_at, *values)
+    unchanged = not_modified(request, response, etag)
+    if unchanged:
+        return unchanged
+
+    # Packs are only loaded once the client's copy is known to be stale
+    packs = db.session.query(Pack).options(
+        *pack_loader_options()).filter_by(trip_id=trip.id).all()
+    payload = jsonable_encoder({
         "trip": trip,
-        "packs": packs,
+        "packs": [PackSchema.from_orm(pack) for pack in packs],
         "user": user
-    }
+    })
+
+    # Only public pages are shared between viewers
+    if trip.published and not trip.removed:
+        info_cache.set(trip_id, {"trip_id": trip.id, "user_id": trip.user_id,
+                                 "etag": etag, "payload": payload})
+
+    return payload
 
 
 @route.get("/sitemap")
@@ -64,6 +92,22 @@ def get_sitemap():
     return data
 
 
+@route.get("/sitemap/index")
+def get_sitemap_index():
+    return {
+        "chunk_size": SITEMAP_CHUNK_SIZE,
+        "chunks": sitemap_index(db.session)
+    }
+
+
+@route.get("/sitemap/{chunk}")
+def get_sitemap_chunk(chunk: int, request: Request):
+    if chunk < 0:
+        raise HTTPException(400, "Invalid sitemap chunk.")
+
+    return chunk_response(request, db.session.get_bind(), chunk)
+
+
 class TripType(BaseModel):
     title: str
     location: str = None
@@ -99,6 +143,7 @@ def create(payload: TripType, user: User = Depends(authenticate)):
             conditions = [dict(trip_id=new_trip.id, condition_id=id)
                           for id in condition_ids]
             db.session.bulk_insert_mappings(TripCondition, conditions)
+            touch_trip(db.session, new_trip.id)
             db.session.commit()
         except:
             pass
@@ -108,11 +153,14 @@ def create(payload: TripType, user: User = Depends(authenticate)):
             geographies = [dict(trip_id=new_trip.id, geography_id=id)
                            for id in geography_ids]
             db.session.bulk_insert_mappings(TripGeography, geographies)
+            touch_trip(db.session, new_trip.id)
             db.session.commit()
         except:
             pass
 
     db.session.refresh(new_trip)
+    if new_trip.published:
+        invalidate_trip_caches(new_trip.id)
 
     return new_trip
 
@@ -132,6 +180,7 @@ def update(payload: TripUpdate, user: User = Depends(authenticate)):
     fields = payload.dict(exclude_none=True)
     condition_ids = fields.pop('condition_ids', None)
     geography_ids = fields.pop('geography_ids', None)
+    was_published = trip.published
 
     try:
         for key, value in fields.items():
@@ -167,11 +216,17 @@ def update(payload: TripUpdate, user: User = Depends(authenticate)):
             pass
 
     try:
+        if condition_ids is not None or geography_ids is not None:
+            touch_trip(db.session, trip.id)
         db.session.commit()
         db.session.refresh(trip)
     except:
         pass
 
+    # Trips that stay unpublished never appear in the public caches
+    if was_published or trip.published:
+        invalidate_trip_caches(trip.id)
+
     return trip
 
 
@@ -193,31 +248,17 @@ def clone(trip_id, user: User = Depends(authenticate)):
 
     try:
         db.session.add(cloned_trip)
+        db.session.flush()
+        clone_packs(db.session, [Pack.trip_id == trip.id], trip_id=cloned_trip.id)
         db.session.commit()
-        db.session.refresh(cloned_trip)
-    except:
+    except Exception as e:
+        print(e)
+        db.session.rollback()
         raise HTTPException(400, "An error occurred while cloning trip.")
 
-    packs = db.session.query(Pack).filter_by(trip_id=trip.id).all()
-    for pack in packs:
-        cloned_pack_data = clone_model(pack, ['trip_id'])
-        cloned_pack = Pack(**cloned_pack_data, trip_id=cloned_trip.id)
-        db.session.add(cloned_pack)
-        db.session.commit()
-        db.session.refresh(cloned_pack)
-
-        for item in pack.items:
-            cloned_item_data = clone_model(item)
-            cloned_item = PackItem(
-                **cloned_item_data,
-                pack_id=cloned_pack.id,
-                item_id=item.item_id
-            )
-            db.session.add(cloned_item)
-            db.session.commit()
-            db.session.refresh(cloned_item)
-
     db.session.refresh(cloned_trip)
+    if cloned_trip.published:
+        invalidate_trip_caches(cloned_trip.id)
 
     return cloned_trip
 
@@ -225,51 +266,77 @@ def clone(trip_id, user: User = Depends(authenticate)):
 @route.post("/{trip_id}/upload-image")
 def upload_image(trip_id, file: UploadFile = File(...), user: User = Depends(authenticate)):
     trip = db.session.query(Trip).filter_by(id=trip_id).first()
-    sort_order = len(trip.images)
+    sort_order = next_rank(db.session, Image, [Image.trip_id == trip.id])
     trip_image = Image(user_id=user.id,
                        trip_id=trip_id,
                        sort_order=sort_order)
 
-    # save thumbnail & resized version
-    temp_original = BytesIO()
-    temp_thumb = BytesIO()
+    try:
+        db.session.add(trip_image)
+        touch_trip(db.session, trip.id)
+        store_image(db.session, trip_image, 'trip', file.file.read())
+        db.session.refresh(trip_image)
+    except HTTPException:
+        db.session.rollback()
+        raise
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(
+            400, "An error occurred while creating image metadata.")
+
+    invalidate_trip_info(trip_id=trip.id)
+
+    return trip_image
+
 
-    img = PILImage.open(file.file)
-    img = ImageOps.exif_transpose(img)
-    img_format = 'PNG'
-    content_type = PILImage.MIME[img_format]
+class UploadRequest(BaseModel):
+    content_type: str
 
-    thumb = img.copy()
 
-    img.thumbnail([1000, 1000], PILImage.ANTIALIAS)
-    thumb.thumbnail([250, 250], PILImage.ANTIALIAS)
+@route.post("/{trip_id}/upload-url")
+def create_upload_url(trip_id, payload: UploadRequest, user: User = Depends(authenticate)):
+    trip = db.session.query(Trip).filter_by(
+        id=trip_id, user_id=user.id).first()
+
+    if not trip:
+        raise HTTPException(400, "Permission denied.")
+
+    return presign_upload(db.session, user.id, payload.content_type)
 
-    img.save(temp_original, format=img_format, quality=65, optimize=True)
-    thumb.save(temp_thumb, format=img_format, quality=85, optimize=True)
-    temp_original.seek(0)
-    temp_thumb.seek(0)
+
+class FinalizeUpload(BaseModel):
+    key: str
+
+
+@route.post("/{trip_id}/finalize-upload")
+def finalize_upload(trip_id, payload: FinalizeUpload, user: User = Depends(authenticate)):
+    trip = db.session.query(Trip).filter_by(
+        id=trip_id, user_id=user.id).first()
+
+    if not trip:
+        raise HTTPException(400, "Permission denied.")
+
+    claim_upload(db.session, user.id, payload.key)
+    trip_image = Image(user_id=user.id,
+                       trip_id=trip.id,
+                       sort_order=next_rank(db.session, Image, [Image.trip_id == trip.id]),
+                       s3=pending_s3('trip', payload.key))
 
     try:
         db.session.add(trip_image)
-        db.session.commit()
-        trip_image.s3 = {'extension': '.png', 'entity': 'trip'}
+        touch_trip(db.session, trip.id)
         db.session.commit()
         db.session.refresh(trip_image)
     except Exception as e:
         print(e)
+        db.session.rollback()
         raise HTTPException(
             400, "An error occurred while creating image metadata.")
 
-    upload_success = s3_file_upload(
-        temp_original, content_type=content_type, key=trip_image.s3_key)
-
-    upload_thumb_success = s3_file_upload(
-        temp_thumb, content_type=content_type, key=trip_image.s3_key_thumb)
-
-    if not upload_success or not upload_thumb_success:
-        db.session.delete(trip_image)
-        db.session.commit()
-        raise HTTPException(400, "An error occurred while saving image.")
+    # Thumbnails and variants are generated in the background
+    queue_processing(trip_image.id, payload.key)
+    invalidate_trip_info(trip_id=trip.id)
 
     return trip_image
 
@@ -288,22 +355,61 @@ class SortTripPhotos(BaseModel):
 
 @route.post("/{trip_id}/sort-photos")
 def sort_images(trip_id, photos: SortTripPhotos, user: User = Depends(authenticate)):
-    photo_mappings = [dict(id=photo.id, sort_order=photo.sort_order)
-                      for photo in photos]
+    trip = db.session.query(Trip).filter_by(
+        id=trip_id, user_id=user.id).first()
+
+    if not trip:
+        raise HTTPException(400, "Permission denied.")
+
+    photo_orders = [(photo.id, photo.sort_order) for photo in photos]
 
     try:
-        db.session.bulk_update_mappings(Image, photo_mappings)
-        trip = db.session.query(Trip).filter_by(
-            id=trip_id, user_id=user.id).first()
+        set_sort_orders(db.session, Image, [
+                        Image.trip_id == trip.id], spaced(photo_orders))
+        touch_trip(db.session, trip.id)
         db.session.commit()
         db.session.refresh(trip)
     except:
         raise HTTPException(
             400, "An error occurred while updating photo order.")
 
+    invalidate_trip_info(trip_id=trip.id)
+
     return trip.images
 
 
+class MovePhoto(BaseModel):
+    id: int
+    after_id: int = None
+    before_id: int = None
+
+
+@route.post("/{trip_id}/move-photo")
+def move_image(trip_id, payload: MovePhoto, user: User = Depends(authenticate)):
+    trip = db.session.query(Trip).filter_by(
+        id=trip_id, user_id=user.id).first()
+
+    if not trip:
+        raise HTTPException(400, "Permission denied.")
+
+    try:
+        sort_order = move(db.session, Image, [Image.trip_id == trip.id],
+                          payload.id, after_id=payload.after_id, before_id=payload.before_id)
+        touch_trip(db.session, trip.id)
+        db.session.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(
+            400, "An error occurred while updating photo order.")
+
+    invalidate_trip_info(trip_id=trip.id)
+
+    return {"id": payload.id, "sort_order": sort_order}
+
+
 @route.delete("/{trip_id}")
 def remove_trip(trip_id, user: User = Depends(authenticate)):
     trip = db.session.query(Trip).filter_by(
@@ -312,10 +418,10 @@ def remove_trip(trip_id, user: User = Depends(authenticate)):
     if not trip:
         raise HTTPException(400, "Permission denied.")
 
-    for image in trip.images:
-        s3_file_delete(image.s3_key)
-        s3_file_delete(image.s3_key_thumb)
-        db.session.delete(image)
+    # Stored objects are removed later by the storage GC worker
+    enqueue_deletion(db.session, release_images(db.session, trip.images))
+    db.session.query(Image).filter_by(trip_id=trip.id).delete(
+        synchronize_session=False)
 
     linked_packs = db.session.query(Pack).filter_by(
         user_id=user.id, trip_id=trip.id).all()
@@ -328,6 +434,10 @@ def remove_trip(trip_id, user: User = Depends(authenticate)):
     except:
         raise HTTPException(400, "An error occurred while deleting trip.")
 
+    notify_storage_gc()
+    if trip.published:
+        invalidate_trip_caches(trip.id)
+
     return True
 
 
@@ -350,11 +460,14 @@ def update_image(trip_id, id, payload: UpdateImage, user: User = Depends(authent
 
     try:
         image.caption = payload.caption
+        touch_trip(db.session, trip.id)
         db.session.commit()
         db.session.refresh(image)
     except:
         raise HTTPException(400, "An error occurred saving image.")
 
+    invalidate_trip_info(trip_id=trip.id)
+
     return image
 
 
@@ -373,6 +486,8 @@ def toggle_publish(trip_id, user: User = Depends(authenticate)):
     except:
         raise HTTPException(400, "An error occurred.")
 
+    invalidate_trip_caches(trip.id)
+
     return trip
 
 
@@ -384,13 +499,19 @@ def remove_image(trip_id, id, user: User = Depends(authenticate)):
     if not trip:
         raise HTTPException(400, "Permission denied.")
 
-    image = db.session.query(Image).filter_by(id=id).first()
-    s3_file_delete(image.s3_key)
-    s3_file_delete(image.s3_key_thumb)
+    image = db.session.query(Image).filter_by(id=id, trip_id=trip.id).first()
 
+    if not image:
+        raise HTTPException(400, "Image not found.")
+
+    enqueue_deletion(db.session, release_images(db.session, [image]))
     db.session.delete(image)
+    touch_trip(db.session, trip.id)
     db.session.commit()
 
+    notify_storage_gc()
+    invalidate_trip_info(trip_id=trip.id)
+
     return {
         "trip_id": trip_id,
         "image_id": id
@@ -405,7 +526,14 @@ def fetch_one(trip_id):
 
 
 @route.get("s")
-def fetch_all(user: User = Depends(authenticate)):
+def fetch_all(cursor: str = None, limit: int = None, fields: str = None, user: User = Depends(authenticate)):
+    if paginated(cursor, limit, fields):
+        # Undated trips sort last so the key stays comparable
+        end_date = func.coalesce(Trip.end_date, datetime.datetime(1970, 1, 1))
+        return keyset_page(db.session, Trip, [Trip.user_id == user.id, Trip.removed == False],
+                           [end_date, Trip.id], cursor=cursor, limit=limit, fields=fields,
+                           descending=True)
+
     trips = db.session.query(Trip).filter_by(
         user_id=user.id, removed=False).order_by(Trip.end_date.desc()).all()
 
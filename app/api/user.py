@@ -1,16 +1,15 @@
-from io import BytesIO
-
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Response
 from fastapi_sqlalchemy import db
 from sqlalchemy import func
 from pydantic import BaseModel
-from PIL import Image as PILImage, ImageOps
 
 from models.base import User, Image, PasswordReset
-from utils.auth import authenticate, generate_jwt
+from utils.auth import authenticate, generate_jwt, invalidate_user
 from utils.consts import DEVELOPMENT
-from utils.digital_ocean import s3_file_upload
+from utils.uploads import claim_upload, pending_s3, presign_upload, queue_processing
+from utils.assets import store_image
 from utils.mailchimp import add_contact
+from utils.trip_cache import invalidate_user_caches
 from utils.mailgun import send_password_reset
 
 route = APIRouter()
@@ -124,6 +123,9 @@ def update(payload: UserUpdate, user: User = Depends(authenticate)):
     except Exception as e:
         print(e)
 
+    invalidate_user(user.id)
+    invalidate_user_caches(user.id)
+
     return user.to_dict()
 
 
@@ -131,36 +133,58 @@ def update(payload: UserUpdate, user: User = Depends(authenticate)):
 def upload_avatar(file: UploadFile = File(...), user: User = Depends(authenticate)):
     avatar = Image(user_id=user.id, avatar=True)
 
-    # save thumbnail
-    temp = BytesIO()
-    img = PILImage.open(file.file)
-    img = ImageOps.exif_transpose(img)
-    img_format = 'PNG'
-    content_type = PILImage.MIME[img_format]
-    img = img.resize([400, 400], PILImage.ANTIALIAS)
-    img.save(temp, format=img_format, optimize=True)
-    temp.seek(0)
+    try:
+        db.session.add(avatar)
+        store_image(db.session, avatar, 'avatar', file.file.read())
+    except HTTPException:
+        db.session.rollback()
+        raise
+    except Exception as e:
+        print(e)
+        db.session.rollback()
+        raise HTTPException(
+            400, "An error occurred while creating image metadata.")
+
+    invalidate_user(user.id)
+    db.session.refresh(user)
+
+    return user
+
+
+class UploadRequest(BaseModel):
+    content_type: str
+
+
+@route.post("/avatar/upload-url")
+def create_avatar_upload_url(payload: UploadRequest, user: User = Depends(authenticate)):
+    return presign_upload(db.session, user.id, payload.content_type)
+
+
+class FinalizeUpload(BaseModel):
+    key: str
+
+
+@route.post("/avatar/finalize-upload")
+def finalize_avatar_upload(payload: FinalizeUpload, user: User = Depends(authenticate)):
+    claim_upload(db.session, user.id, payload.key)
+    # The current avatar stays in place until this one has been processed
+    avatar = Image(user_id=user.id, avatar=False,
+                   s3=pending_s3('avatar', payload.key))
 
     try:
         db.session.add(avatar)
         db.session.commit()
-        avatar.s3 = {'extension': '.png', 'entity': 'avatar'}
-        db.session.commit()
         db.session.refresh(avatar)
     except Exception as e:
+        print(e)
+        db.session.rollback()
         raise HTTPException(
             400, "An error occurred while creating image metadata.")
 
-    upload_success = s3_file_upload(
-        temp, content_type=content_type, key=avatar.s3_key)
-    if not upload_success:
-        db.session.delete(avatar)
-        db.session.commit()
-        raise HTTPException(400, "An error occurred while saving avatar.")
-
-    db.session.refresh(user)
+    # The avatar is resized in the background
+    queue_processing(avatar.id, payload.key)
 
-    return user
+    return avatar
 
 
 @route.get("")
@@ -249,4 +273,6 @@ def password_reset(payload: PasswordResetData):
         print(e)
         raise HTTPException(400, "An error occurred.")
 
+    invalidate_user(user.id)
+
     return Response(status_code=200)
@@ -1,9 +1,12 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_sqlalchemy import DBSessionMiddleware
 
+from utils.auth import authenticate_admin
+from utils.cache import cache_stats
 from utils.consts import DATABASE_URL, DEVELOPMENT
-from api import user, resources, item, trip, category, pack
+from utils.storage import start_storage_gc
+from api import user, resources, item, trip, category, pack, sync
 
 if DEVELOPMENT:
     # Create the database tables if they don't exist
@@ -71,6 +74,24 @@ app.include_router(
 )
 
 
+app.include_router(
+    sync.route,
+    prefix="/sync",
+    tags=["sync"],
+    responses={404: {"description": "Not found"}}
+)
+
+
+@app.on_event("startup")
+def start_workers():
+    start_storage_gc()
+
+
 @app.get("/health-check")
 def health_check():
     return "Packstack API is available"
+
+
+@app.get("/health-check/cache", dependencies=[Depends(authenticate_admin)])
+def health_check_cache():
+    return cache_stats()
@@ -0,0 +1,39 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from utils.consts import DATABASE_URL, DEVELOPMENT
+
+# Kept apart from the models package's own alembic_version table
+VERSION_TABLE = 'api_alembic_version'
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+
+def run_migrations_offline():
+    context.configure(url=DATABASE_URL, version_table=VERSION_TABLE,
+                      literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(DATABASE_URL)
+
+    if DEVELOPMENT:
+        # Production databases get the shared tables from the models package
+        from models.base import Base
+        Base.metadata.create_all(engine)
+
+    with engine.connect() as connection:
+        context.configure(connection=connection, version_table=VERSION_TABLE)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,35 @@
+"""add sync indexes
+
+Keep /sync change queries proportional to the number of changes.
+
+Revision ID: 1d78ef906d85
+Revises:
+Create Date: 2026-10-18 12:04:10.738631
+
+"""
+from alembic import op
+
+from models.base import Item, ItemCategory, Pack, Trip
+
+
+# revision identifiers, used by Alembic.
+revision = '1d78ef906d85'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+SYNCED = [Item, ItemCategory, Pack, Trip]
+
+
+def upgrade() -> None:
+    # Built without locking writes; CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for model in SYNCED:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{model.__tablename__}_user_id_updated_at '
+                       f'ON "{model.__tablename__}" (user_id, updated_at)')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for model in SYNCED:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{model.__tablename__}_user_id_updated_at')
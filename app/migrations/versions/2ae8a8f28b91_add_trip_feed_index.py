@@ -0,0 +1,31 @@
+"""add trip feed index
+
+Serves the public feed's (end_date, id) keyset pages from published trips only.
+
+Revision ID: 2ae8a8f28b91
+Revises: 9053d8fa4992
+Create Date: 2026-10-18 12:05:30.512040
+
+"""
+from alembic import op
+
+from models.base import Trip
+
+
+# revision identifiers, used by Alembic.
+revision = '2ae8a8f28b91'
+down_revision = '9053d8fa4992'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_trip_feed '
+                   f'ON "{Trip.__tablename__}" (end_date DESC, id DESC) '
+                   f'WHERE published = true AND removed = false AND end_date IS NOT NULL')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_trip_feed')
@@ -0,0 +1,39 @@
+"""add storage_deletion table
+
+Queue of stored objects waiting for the storage GC worker.
+
+Revision ID: 43f243437af6
+Revises: 2ae8a8f28b91
+Create Date: 2026-10-18 12:06:02.117355
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '43f243437af6'
+down_revision = '2ae8a8f28b91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Development databases may already have it from create_all
+    if sa.inspect(op.get_bind()).has_table('storage_deletion'):
+        return
+
+    op.create_table(
+        'storage_deletion',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('key', sa.String, nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False),
+        sa.Column('not_before', sa.DateTime, nullable=False),
+        sa.Column('last_error', sa.String, nullable=True),
+        sa.Column('created_at', sa.DateTime),
+    )
+    op.create_index('ix_storage_deletion_not_before', 'storage_deletion', ['not_before'])
+
+
+def downgrade() -> None:
+    op.drop_table('storage_deletion')
@@ -0,0 +1,28 @@
+"""add storage_deletion key index
+
+Lets cancel_deletion find a re-used key without scanning the queue.
+
+Revision ID: 4c9d37a89fe3
+Revises: bc3138a0a69b
+Create Date: 2026-10-18 12:23:00.666628
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9d37a89fe3'
+down_revision = 'bc3138a0a69b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Development databases may already have it from create_all
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_storage_deletion_key ON storage_deletion (key)')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_storage_deletion_key')
@@ -0,0 +1,44 @@
+"""add import_job table
+
+Progress of background item imports for IMPORT_JOB_STORE=postgres.
+
+Revision ID: 9053d8fa4992
+Revises: 1d78ef906d85
+Create Date: 2026-10-18 12:04:56.223473
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9053d8fa4992'
+down_revision = '1d78ef906d85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Development databases may already have it from create_all
+    if sa.inspect(op.get_bind()).has_table('import_job'):
+        return
+
+    op.create_table(
+        'import_job',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('user_id', sa.Integer, nullable=False),
+        sa.Column('kind', sa.String(32), nullable=False),
+        sa.Column('status', sa.String(16), nullable=False),
+        sa.Column('rows', sa.Integer, nullable=False),
+        sa.Column('count', sa.Integer, nullable=False),
+        sa.Column('error_count', sa.Integer, nullable=False),
+        sa.Column('errors', sa.JSON, nullable=False),
+        sa.Column('detail', sa.String, nullable=True),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+    )
+    op.create_index('ix_import_job_user_id', 'import_job', ['user_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('import_job')
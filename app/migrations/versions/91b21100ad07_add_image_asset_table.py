@@ -0,0 +1,40 @@
+"""add image_asset table
+
+Processed renditions shared by every image with the same content.
+
+Revision ID: 91b21100ad07
+Revises: 43f243437af6
+Create Date: 2026-10-18 12:07:41.563207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91b21100ad07'
+down_revision = '43f243437af6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Development databases may already have it from create_all
+    if sa.inspect(op.get_bind()).has_table('image_asset'):
+        return
+
+    op.create_table(
+        'image_asset',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('hash', sa.String(64), nullable=False),
+        sa.Column('entity', sa.String(16), nullable=False),
+        sa.Column('s3', sa.JSON, nullable=False),
+        sa.Column('ref_count', sa.Integer, nullable=False),
+        sa.Column('created_at', sa.DateTime),
+        # Uploads race to register an asset; ON CONFLICT relies on this
+        sa.UniqueConstraint('hash', 'entity', name='image_asset_hash_entity_key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('image_asset')
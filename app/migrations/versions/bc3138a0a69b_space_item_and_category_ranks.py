@@ -0,0 +1,42 @@
+"""space item and category ranks
+
+Spread each user's contiguous sort_order values RANK_GAP apart, so the first
+move in a list does not have to rebalance it.
+
+Revision ID: bc3138a0a69b
+Revises: 91b21100ad07
+Create Date: 2026-10-18 12:21:27.672189
+
+"""
+from alembic import op
+
+from models.base import Item, ItemCategory
+
+
+# revision identifiers, used by Alembic.
+revision = 'bc3138a0a69b'
+down_revision = '91b21100ad07'
+branch_labels = None
+depends_on = None
+
+# utils.ranking.RANK_GAP when this revision was written
+RANK_GAP = 1024
+RANKED = [Item, ItemCategory]
+
+
+def upgrade() -> None:
+    # Same order as utils.ranking.rebalance; updated_at is bumped so sync
+    # clients pick up the new ranks
+    for model in RANKED:
+        table = model.__tablename__
+        op.execute(f'''
+            UPDATE "{table}" SET sort_order = ranked.rank, updated_at = timezone('utc', now())
+            FROM (SELECT id, row_number() OVER (
+                      PARTITION BY user_id ORDER BY sort_order NULLS LAST, id) * {RANK_GAP} AS rank
+                  FROM "{table}") AS ranked
+            WHERE "{table}".id = ranked.id AND "{table}".sort_order IS DISTINCT FROM ranked.rank''')
+
+
+def downgrade() -> None:
+    # Spaced ranks keep the same order, so there is nothing to undo
+    pass
@@ -0,0 +1,110 @@
+import pytest
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from models.base import Image
+from utils import assets
+from utils.assets import ImageAsset, release_images, store_image
+from utils.storage import StorageDeletion
+
+
+def rendition(extension=".jpg", content_type="image/jpeg", **fields):
+    return {"extension": extension, "content_type": content_type, "data": b"data", **fields}
+
+
+PROCESSED = {
+    "original": rendition(),
+    "thumb": rendition(),
+    "variants": [rendition(".webp", "image/webp", format="webp", width=250, height=200)],
+}
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """Fake the image pool and bucket, recording the keys written and copied."""
+    keys = []
+    monkeypatch.setattr(assets, "transform", lambda fn, data, timeout=None: PROCESSED)
+
+    def files_upload(uploads):
+        keys.extend(key for _, _, key in uploads)
+        return True
+
+    def files_copy(copies):
+        keys.extend(key for _, key in copies)
+        return True
+
+    monkeypatch.setattr(assets, "s3_files_upload", files_upload)
+    monkeypatch.setattr(assets, "s3_files_copy", files_copy)
+    return keys
+
+
+def upload(session, user, data=b"photo"):
+    image = Image(user_id=user.id, sort_order=0)
+    session.add(image)
+    store_image(session, image, "trip", data)
+    return image
+
+
+def asset_for(session, image):
+    return session.get(ImageAsset, image.s3["asset_id"])
+
+
+def test_duplicates_share_variants_and_copy_their_fallback_keys(session, user, stored):
+    first = upload(session, user)
+    written = list(stored)
+    assert written == [f"trip/{first.id}.jpg", f"trip/{first.id}-thumb.jpg", f"trip/{first.id}-250.webp"]
+
+    duplicate = upload(session, user)
+    assert stored[len(written):] == [duplicate.s3_key, duplicate.s3_key_thumb]
+    assert (duplicate.s3["key"], duplicate.s3["thumb_key"]) == (duplicate.s3_key, duplicate.s3_key_thumb)
+    assert duplicate.s3["asset_id"] == first.s3["asset_id"]
+    assert duplicate.s3["variants"] == first.s3["variants"]
+    assert asset_for(session, first).ref_count == 2
+
+    other = upload(session, user, data=b"another photo")
+    assert other.s3["asset_id"] != first.s3["asset_id"]
+    assert other.s3["key"] == f"trip/{other.id}.jpg"
+
+
+def test_release_keeps_shared_renditions_until_the_last_reference(session, user, stored):
+    first = upload(session, user)
+    duplicate = upload(session, user)
+    asset_id = first.s3["asset_id"]
+
+    assert release_images(session, [first]) == []
+    assert session.get(ImageAsset, asset_id).ref_count == 1
+
+    keys = release_images(session, [duplicate])
+    assert sorted(keys) == sorted(stored)
+    assert {duplicate.s3_key, duplicate.s3_key_thumb} <= set(keys)
+    session.expire_all()
+    assert session.get(ImageAsset, asset_id) is None
+
+
+def test_release_drops_every_reference_in_one_call(session, user, stored):
+    images = [upload(session, user) for _ in range(3)]
+
+    keys = release_images(session, images)
+
+    assert sorted(keys) == sorted(stored)
+    assert session.scalar(select(ImageAsset).where(ImageAsset.id == images[0].s3["asset_id"])) is None
+
+
+def test_failed_storage_commits_nothing_and_queues_written_keys(session, user, stored, monkeypatch):
+    def files_upload(uploads):
+        stored.extend(key for _, _, key in uploads)
+        return False
+
+    monkeypatch.setattr(assets, "s3_files_upload", files_upload)
+    monkeypatch.setattr(assets, "notify_storage_gc", lambda: None)
+
+    image = Image(user_id=user.id, sort_order=0)
+    session.add(image)
+    with pytest.raises(HTTPException):
+        store_image(session, image, "trip", b"photo")
+
+    assert len(stored) == 3
+    assert session.scalars(select(ImageAsset)).all() == []
+    assert session.scalars(select(Image)).all() == []
+    assert set(session.scalars(select(StorageDeletion.key))) == set(stored)
@@ -0,0 +1,31 @@
+import pytest
+
+from fastapi import HTTPException
+
+from utils import auth
+
+
+def test_admin_endpoints_need_the_admin_token(monkeypatch):
+    monkeypatch.setattr(auth, "DEVELOPMENT", 0)
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+
+    auth.authenticate_admin(Authorization="Bearer secret")
+    for header in [None, "Bearer wrong", "secret"]:
+        with pytest.raises(HTTPException) as error:
+            auth.authenticate_admin(Authorization=header)
+        assert error.value.status_code == 403
+
+
+def test_admin_endpoints_are_closed_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(auth, "DEVELOPMENT", 0)
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", None)
+
+    with pytest.raises(HTTPException):
+        auth.authenticate_admin(Authorization="Bearer None")
+
+
+def test_admin_endpoints_are_open_in_development(monkeypatch):
+    monkeypatch.setattr(auth, "DEVELOPMENT", "1")
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", None)
+
+    auth.authenticate_admin(Authorization=None)
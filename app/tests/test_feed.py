@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+
+from models.base import Trip
+from utils.feed import feed_cache, feed_key, feed_page
+
+NOW = datetime.datetime.utcnow()
+
+
+@pytest.fixture(autouse=True)
+def empty_feed_cache():
+    feed_cache.clear()
+    yield
+    feed_cache.clear()
+
+
+def add_trip(session, user, days_ago, **fields):
+    fields.setdefault("published", True)
+    trip = Trip(user_id=user.id, title=f"{days_ago} days ago",
+                end_date=NOW - datetime.timedelta(days=days_ago), **fields)
+    session.add(trip)
+    session.commit()
+    return trip
+
+
+def test_feed_lists_finished_published_trips_newest_first(session, user):
+    older, newer = add_trip(session, user, 3), add_trip(session, user, 1)
+    add_trip(session, user, -2)
+    add_trip(session, user, 2, published=False)
+    add_trip(session, user, 2, removed=True)
+
+    trips, next_cursor = feed_page(session)
+    assert [trip["id"] for trip in trips] == [newer.id, older.id]
+    assert next_cursor is None
+
+
+def test_feed_pages_follow_the_cursor(session, user):
+    trips = [add_trip(session, user, days_ago) for days_ago in (1, 2, 3)]
+
+    first, cursor = feed_page(session, limit=2)
+    second, last_cursor = feed_page(session, cursor=cursor, limit=2)
+    assert [trip["id"] for trip in first + second] == [trip.id for trip in trips]
+    assert last_cursor is None
+
+
+def test_feed_key_promotes_dates_to_datetimes():
+    trip = Trip(id=7, end_date=datetime.date(2026, 5, 1))
+    assert feed_key(trip) == (datetime.datetime(2026, 5, 1), 7)
@@ -0,0 +1,57 @@
+import io
+
+import pytest
+
+from sqlalchemy import select
+
+from models.base import Item
+from utils import importer
+from utils.importer import iter_csv_rows, iter_lines
+
+
+class ReadOnly:
+    """A binary upload exposing only read(), like SpooledTemporaryFile before Python 3.11."""
+
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 1024])
+def test_iter_lines_splits_across_chunks(monkeypatch, chunk_size):
+    monkeypatch.setattr(importer, "READ_CHUNK_SIZE", chunk_size)
+    data = "a,b\r\nc\rd\nété\r\nlast".encode()
+
+    assert list(iter_lines(ReadOnly(data))) == ["a,b\r\n", "c\r", "d\n", "été\r\n", "last"]
+
+
+def test_iter_csv_rows_keeps_quoted_newlines(monkeypatch):
+    monkeypatch.setattr(importer, "READ_CHUNK_SIZE", 4)
+    data = b'Name , Notes\r\nTent,"two\r\nlines"\r\nStove,\r\n'
+
+    assert list(iter_csv_rows(ReadOnly(data))) == [
+        {"name": "Tent", "notes": "two\r\nlines"}, {"name": "Stove", "notes": ""}]
+
+
+def test_streamed_csv_import(client, session, user):
+    csv = b"name,weight,unit,category\nTent,1200,g,Shelter\nStove,300,g,Kitchen\n"
+
+    response = client.post("/item/import/csv?stream=true",
+                           files={"file": ("items.csv", csv, "text/csv")})
+
+    assert response.status_code == 200
+    assert response.json() == {"success": True, "errors": [], "count": 2}
+    names = session.scalars(select(Item.name).where(Item.user_id == user.id)).all()
+    assert sorted(names) == ["Stove", "Tent"]
+
+
+def test_streamed_csv_import_reports_errors(client, session, user):
+    csv = b"name,weight,unit\nTent,heavy,g\n"
+
+    response = client.post("/item/import/csv?stream=true",
+                           files={"file": ("items.csv", csv, "text/csv")})
+
+    assert response.json()["success"] is False
+    assert session.scalars(select(Item).where(Item.user_id == user.id)).all() == []
@@ -0,0 +1,54 @@
+from models.base import Item
+from api.item import MAX_BATCH_SIZE
+
+
+def add_item(session, user, **fields):
+    item = Item(user_id=user.id, **fields)
+    session.add(item)
+    session.commit()
+    return item
+
+
+def test_mixed_batch_applies_every_operation(client, session, user):
+    kept = add_item(session, user, name="Tent", weight=1200, unit="g")
+    dropped = add_item(session, user, name="Stove", weight=300, unit="g")
+
+    response = client.post("/items/batch", json=[
+        {"op": "create", "item": {"name": "Quilt", "weight": 600, "unit": "g", "brand_new": "Enlightened"}},
+        {"op": "update", "id": kept.id, "item": {"name": "Tent 2P", "weight": 1100}},
+        {"op": "delete", "id": dropped.id},
+    ])
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["success"] for result in results] == [True, True, True]
+
+    session.expire_all()
+    created = session.get(Item, results[0]["id"])
+    assert created.name == "Quilt" and created.user_id == user.id and created.brand_id
+    assert session.get(Item, kept.id).name == "Tent 2P"
+    assert session.get(Item, kept.id).weight == 1100
+    assert session.get(Item, kept.id).unit == "g"
+    assert session.get(Item, dropped.id).removed is True
+
+
+def test_batch_reports_invalid_operations_without_failing_the_rest(client, session, user):
+    response = client.post("/items/batch", json=[
+        {"op": "update", "id": 999999, "item": {"name": "Ghost"}},
+        {"op": "rename", "id": 1},
+        {"op": "create", "item": {"name": "Spork"}},
+    ])
+
+    assert response.status_code == 200
+    results = response.json()
+    assert results[0] == {"op": "update", "success": False, "id": 999999, "error": "Item not found."}
+    assert results[1]["success"] is False
+    assert results[2]["success"] is True
+    assert session.get(Item, results[2]["id"]).name == "Spork"
+
+
+def test_batch_rejects_oversized_batches(client, session, user):
+    response = client.post("/items/batch", json=[{"op": "create", "item": {"name": "Spork"}}] * (MAX_BATCH_SIZE + 1))
+
+    assert response.status_code == 400
+    assert session.query(Item).filter_by(user_id=user.id).count() == 0
@@ -0,0 +1,36 @@
+import pytest
+
+from fastapi import HTTPException
+
+from utils import jobs
+
+
+@pytest.fixture(autouse=True)
+def caps(monkeypatch):
+    monkeypatch.setattr(jobs, "IMPORT_MAX_PENDING", 3)
+    monkeypatch.setattr(jobs, "IMPORT_MAX_PENDING_PER_USER", 2)
+    monkeypatch.setattr(jobs, "_pending", jobs.Counter())
+
+
+def test_reserve_import_caps_each_user():
+    jobs.reserve_import(1)
+    jobs.reserve_import(1)
+    with pytest.raises(HTTPException) as error:
+        jobs.reserve_import(1)
+    assert error.value.status_code == 429
+
+    jobs.release_import(1)
+    jobs.reserve_import(1)
+
+
+def test_reserve_import_caps_the_process():
+    jobs.reserve_import(1)
+    jobs.reserve_import(2)
+    jobs.reserve_import(3)
+    with pytest.raises(HTTPException) as error:
+        jobs.reserve_import(4)
+    assert error.value.status_code == 429
+
+    jobs.release_import(2)
+    jobs.reserve_import(4)
+    assert jobs._pending == {1: 1, 3: 1, 4: 1}
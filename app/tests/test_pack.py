@@ -0,0 +1,108 @@
+from sqlalchemy import select
+
+from models.base import Item, Pack, PackItem
+
+
+def make_pack(session, user, item_count, **fields):
+    items = [Item(user_id=user.id, name=f"Item {i}") for i in range(item_count)]
+    pack = Pack(user_id=user.id, title="Weekend", **fields)
+    session.add_all(items + [pack])
+    session.flush()
+    session.add_all([PackItem(pack_id=pack.id, item_id=item.id, quantity=i + 1, worn=i == 0,
+                              checked=False, sort_order=i) for i, item in enumerate(items)])
+    session.commit()
+    return pack, items
+
+
+def pack_rows(session, pack_id):
+    return session.execute(
+        select(PackItem.item_id, PackItem.quantity, PackItem.worn, PackItem.checked, PackItem.sort_order)
+        .where(PackItem.pack_id == pack_id).order_by(PackItem.item_id)).all()
+
+
+def test_clone_packs_copies_packs_and_items(session, user):
+    from utils.pack import clone_packs
+
+    first, items = make_pack(session, user, 3)
+    second, _ = make_pack(session, user, 2)
+    empty, _ = make_pack(session, user, 0)
+
+    copies = clone_packs(session, [Pack.id.in_([first.id, second.id, empty.id])], title="Copy")
+    session.commit()
+
+    assert set(copies) == {first.id, second.id, empty.id}
+    assert not set(copies.values()) & set(copies)
+    for source, copy in copies.items():
+        assert session.get(Pack, copy).title == "Copy"
+        assert session.get(Pack, copy).user_id == user.id
+        assert pack_rows(session, copy) == pack_rows(session, source)
+
+    # Sources are left untouched
+    assert len(pack_rows(session, first.id)) == 3
+    assert session.get(Pack, first.id).title == "Weekend"
+
+
+def test_clone_packs_without_matches(session, user):
+    from utils.pack import clone_packs
+
+    assert clone_packs(session, [Pack.id == -1]) == {}
+
+
+class Submitted:
+    def __init__(self, item_id, quantity=1, worn=False, checked=False, sort_order=0):
+        self.item_id = item_id
+        self.quantity = quantity
+        self.worn = worn
+        self.checked = checked
+        self.sort_order = sort_order
+
+
+def test_sync_pack_items_writes_only_the_differences(session, user):
+    from utils.pack import sync_pack_items
+
+    pack, items = make_pack(session, user, 3)
+    extra = Item(user_id=user.id, name="Extra")
+    session.add(extra)
+    session.flush()
+
+    result = sync_pack_items(session, pack.id, [
+        Submitted(items[0].id, quantity=1, worn=True, sort_order=0),  # unchanged
+        Submitted(items[1].id, quantity=5, sort_order=1),  # changed
+        Submitted(extra.id, quantity=1, sort_order=2),  # added
+    ])
+    session.commit()
+
+    assert result == {"added": 1, "changed": 1, "removed": 1}
+    assert pack_rows(session, pack.id) == [
+        (items[0].id, 1, True, False, 0),
+        (items[1].id, 5, False, False, 1),
+        (extra.id, 1, False, False, 2),
+    ]
+
+
+def test_sync_pack_items_keeps_the_last_duplicate(session, user):
+    from utils.pack import sync_pack_items
+
+    pack, items = make_pack(session, user, 1)
+    result = sync_pack_items(session, pack.id, [
+        Submitted(items[0].id, quantity=2), Submitted(items[0].id, quantity=3)])
+
+    assert result == {"added": 0, "changed": 1, "removed": 0}
+    assert pack_rows(session, pack.id) == [(items[0].id, 3, False, False, 0)]
+
+
+def test_packs_etag_tracks_pack_and_item_changes(client, session, user):
+    pack, items = make_pack(session, user, 2)
+
+    etag = client.get("/packs").headers["etag"]
+    assert client.get("/packs", headers={"If-None-Match": etag}).status_code == 304
+
+    response = client.put(f"/pack/{pack.id}/checklist", json={"all": True})
+    assert response.json() == {"updated": 2}
+    response = client.get("/packs", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    items[0].name = "Renamed"
+    session.commit()
+    assert client.get("/packs", headers={"If-None-Match": etag}).status_code == 200
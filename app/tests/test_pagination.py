@@ -0,0 +1,63 @@
+import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, keyset_page, page_size
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    values = [datetime.datetime(2023, 5, 1, 12, 30), 42, "x"]
+    assert decode_cursor(encode_cursor(values), 3) == values
+
+
+@pytest.mark.parametrize("token", ["not-base64!", encode_cursor([1, 2])])
+def test_decode_cursor_rejects_bad_tokens(token):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(token, 1)
+    assert error.value.status_code == 400
+
+
+def test_page_size_bounds():
+    assert page_size(10) == 10
+    assert page_size(MAX_PAGE_SIZE + 1) == MAX_PAGE_SIZE
+    with pytest.raises(HTTPException):
+        page_size(0)
+
+
+def test_keyset_page_walks_every_row_once(session, user):
+    from models.base import Item
+
+    session.add_all([Item(user_id=user.id, name=f"Item {i}") for i in range(7)])
+    session.flush()
+    where = [Item.user_id == user.id]
+
+    seen, cursor = [], None
+    while True:
+        page = keyset_page(session, Item, where, [Item.id], cursor=cursor, limit=3)
+        seen += [item.id for item in page["data"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 7
+    assert seen == sorted(seen)
+
+
+def test_keyset_page_descending_with_projection(session, user):
+    from models.base import Item
+
+    items = [Item(user_id=user.id, name=f"Item {i}") for i in range(3)]
+    session.add_all(items)
+    session.flush()
+
+    page = keyset_page(session, Item, [Item.user_id == user.id], [Item.id],
+                       limit=2, fields="id,name", descending=True)
+
+    assert page["data"] == [{"id": items[2].id, "name": "Item 2"}, {"id": items[1].id, "name": "Item 1"}]
+    rest = keyset_page(session, Item, [Item.user_id == user.id], [Item.id],
+                       cursor=page["next_cursor"], fields="id", descending=True)
+    assert rest == {"data": [{"id": items[0].id}], "next_cursor": None, "limit": 100}
+
+    with pytest.raises(HTTPException):
+        keyset_page(session, Item, [], [Item.id], fields="id,secret")
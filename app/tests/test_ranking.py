@@ -0,0 +1,86 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from models.base import Item
+from utils.ranking import RANK_GAP, move, next_rank, rebalance, set_sort_orders
+
+
+@pytest.fixture
+def items(session, user):
+    items = [Item(user_id=user.id, name=name, sort_order=i) for i, name in enumerate("abcde")]
+    session.add_all(items)
+    session.flush()
+    return items
+
+
+def order(session, user):
+    return session.scalars(select(Item.name).where(Item.user_id == user.id)
+                           .order_by(Item.sort_order, Item.id)).all()
+
+
+def scope(user):
+    return [Item.user_id == user.id]
+
+
+def test_rebalance_spreads_rows_and_keeps_order(session, user, items):
+    rebalance(session, Item, scope(user))
+
+    ranks = session.scalars(select(Item.sort_order).where(Item.user_id == user.id)
+                            .order_by(Item.sort_order)).all()
+    assert ranks == [RANK_GAP * (i + 1) for i in range(5)]
+    assert order(session, user) == list("abcde")
+
+
+def test_move_rebalances_when_there_is_no_gap(session, user, items):
+    # Adjacent integer ranks leave no room between "a" and "b"
+    rank = move(session, Item, scope(user), items[4].id, after_id=items[0].id)
+
+    assert order(session, user) == list("aebcd")
+    assert session.scalar(select(Item.sort_order).where(Item.id == items[4].id)) == rank
+
+
+def test_move_writes_only_the_moved_row_when_there_is_room(session, user, items):
+    rebalance(session, Item, scope(user))
+    before = dict(session.execute(select(Item.id, Item.sort_order).where(Item.user_id == user.id)).all())
+
+    move(session, Item, scope(user), items[0].id, before_id=items[3].id)
+    after = dict(session.execute(select(Item.id, Item.sort_order).where(Item.user_id == user.id)).all())
+
+    assert order(session, user) == list("bcade")
+    assert [item_id for item_id in before if before[item_id] != after[item_id]] == [items[0].id]
+
+
+def test_move_to_the_end(session, user, items):
+    move(session, Item, scope(user), items[0].id, after_id=items[4].id)
+    assert order(session, user) == list("bcdea")
+
+
+def test_move_rejects_rows_outside_the_scope(session, user, items):
+    with pytest.raises(HTTPException):
+        move(session, Item, [Item.user_id == user.id + 1], items[0].id, after_id=items[1].id)
+    with pytest.raises(HTTPException):
+        move(session, Item, scope(user), items[0].id)
+
+
+def test_set_sort_orders_applies_pairs(session, user, items):
+    set_sort_orders(session, Item, scope(user), [(items[0].id, 10), (items[1].id, 9)])
+    assert order(session, user) == list("cdeba")
+
+
+def test_full_list_sort_leaves_room_for_moves(client, session, user, items):
+    session.commit()
+    response = client.put("/item/sort", json=[{"id": item.id, "sort_order": i} for i, item in enumerate(items)])
+    assert response.status_code == 200
+    before = dict(session.execute(select(Item.id, Item.sort_order).where(Item.user_id == user.id)).all())
+    assert sorted(before.values()) == [RANK_GAP * i for i in range(5)]
+
+    move(session, Item, scope(user), items[4].id, after_id=items[0].id)
+    after = dict(session.execute(select(Item.id, Item.sort_order).where(Item.user_id == user.id)).all())
+    assert [item_id for item_id in before if before[item_id] != after[item_id]] == [items[4].id]
+
+
+def test_next_rank_appends_after_the_last_row(session, user, items):
+    rebalance(session, Item, scope(user))
+    assert next_rank(session, Item, scope(user)) == 6 * RANK_GAP
+    assert next_rank(session, Item, [Item.user_id == user.id + 1]) == RANK_GAP
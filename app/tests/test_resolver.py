@@ -0,0 +1,82 @@
+from sqlalchemy import func, select
+
+from models.base import Brand, Category, ItemCategory, Product
+from utils.item_category import get_or_create_item_category
+from utils.ranking import RANK_GAP
+from utils.resolver import resolve_brands, resolve_categories, resolve_item_categories, resolve_products, \
+    rows_to_map, unique_names
+
+
+def test_unique_names_keeps_the_first_spelling():
+    assert unique_names([" Zpacks", "zpacks", "", None, "  ", "Nemo"]) == {
+        "zpacks": "Zpacks", "nemo": "Nemo"}
+
+
+def test_rows_to_map_handles_compound_keys():
+    assert rows_to_map([("a", 1), ("b", 2)]) == {"a": 1, "b": 2}
+    assert rows_to_map([(1, "a", 3)]) == {(1, "a"): 3}
+
+
+def test_resolve_brands_reuses_and_creates(session):
+    existing = Brand(name="Zpacks")
+    session.add(existing)
+    session.flush()
+
+    brands = resolve_brands(session, ["zpacks", "Nemo", "NEMO", None])
+
+    assert brands["zpacks"] == existing.id
+    assert session.get(Brand, brands["nemo"]).name == "Nemo"
+    assert session.scalar(select(func.count()).where(func.lower(Brand.name) == "nemo")) == 1
+
+
+def test_resolve_products_are_scoped_to_their_brand(session):
+    first, second = Brand(name="First"), Brand(name="Second")
+    session.add_all([first, second])
+    session.flush()
+
+    products = resolve_products(session, [(first.id, "Tent"), (second.id, "tent"), (first.id, " TENT ")])
+
+    assert len(products) == 2
+    assert session.get(Product, products[(first.id, "tent")]).brand_id == first.id
+    assert session.get(Product, products[(second.id, "tent")]).brand_id == second.id
+
+
+def test_resolve_categories_prefers_the_users_own(session, user):
+    generic = Category(name="Shelter")
+    own = Category(name="shelter", user_id=user.id)
+    session.add_all([generic, own])
+    session.flush()
+
+    categories = resolve_categories(session, ["Shelter", "Kitchen"], user.id)
+
+    assert categories["shelter"] == own.id
+    assert session.get(Category, categories["kitchen"]).user_id == user.id
+
+
+def test_resolve_item_categories_appends_in_order(session, user):
+    categories = [Category(name=name) for name in ("A", "B", "C")]
+    session.add_all(categories)
+    session.flush()
+    session.add(ItemCategory(user_id=user.id, category_id=categories[0].id, sort_order=RANK_GAP))
+    session.flush()
+
+    item_categories = resolve_item_categories(session, [c.id for c in categories], user.id)
+
+    orders = {category_id: session.get(ItemCategory, item_category_id).sort_order
+              for category_id, item_category_id in item_categories.items()}
+    assert orders == {categories[0].id: RANK_GAP, categories[1].id: 2 * RANK_GAP, categories[2].id: 3 * RANK_GAP}
+
+
+def test_get_or_create_item_category_appends_new_categories(session, user):
+    shelter, kitchen = Category(name="Shelter"), Category(name="Kitchen")
+    session.add_all([shelter, kitchen])
+    session.flush()
+    existing = ItemCategory(user_id=user.id, category_id=shelter.id, sort_order=5 * RANK_GAP)
+    session.add(existing)
+    session.flush()
+
+    assert get_or_create_item_category(session, shelter.id, user.id) == existing.id
+
+    created = session.get(ItemCategory, get_or_create_item_category(session, kitchen.id, user.id))
+    assert (created.category_id, created.user_id) == (kitchen.id, user.id)
+    assert created.sort_order == 6 * RANK_GAP
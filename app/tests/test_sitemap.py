@@ -0,0 +1,44 @@
+import gzip
+import json
+
+import pytest
+
+from models.base import Trip
+from utils.sitemap import chunk_of, invalidate_sitemap, sitemap_cache, sitemap_index, stream_chunk
+
+
+@pytest.fixture
+def trip(session, user):
+    sitemap_cache.clear()
+    trip = Trip(user_id=user.id, title="Sierra High Route", published=True, removed=False)
+    session.add(trip)
+    session.commit()
+    yield trip
+    sitemap_cache.clear()
+
+
+def test_streamed_chunk_is_cached(connection, trip):
+    chunk = chunk_of(trip.id)
+    body = b"".join(stream_chunk(connection, chunk, gzip_output=False))
+
+    assert [row["id"] for row in json.loads(body)] == [trip.id]
+    assert gzip.decompress(sitemap_cache.get(chunk)) == body
+
+
+def test_chunk_invalidated_while_streaming_is_not_cached(connection, trip):
+    chunk = chunk_of(trip.id)
+    stream = stream_chunk(connection, chunk, gzip_output=True)
+    next(stream)
+
+    invalidate_sitemap(trip.id)
+    list(stream)
+
+    assert sitemap_cache.get(chunk) is None
+    b"".join(stream_chunk(connection, chunk, gzip_output=True))
+    assert sitemap_cache.get(chunk) is not None
+
+
+def test_index_lists_chunks(session, trip):
+    assert sitemap_index(session) == [
+        {"chunk": chunk_of(trip.id), "trips": 1, "updated_at": trip.updated_at}]
+    assert sitemap_cache.get('index') is not None
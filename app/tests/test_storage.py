@@ -0,0 +1,35 @@
+import datetime
+
+from sqlalchemy import delete, select
+
+from utils import storage
+from utils.storage import StorageDeletion, collect_garbage, enqueue_deletion
+
+
+def queued(session):
+    return {row.key: row for row in session.scalars(select(StorageDeletion))}
+
+
+def test_collect_garbage_deletes_and_reschedules(session, monkeypatch):
+    session.execute(delete(StorageDeletion))
+    enqueue_deletion(session, ["a.jpg", None, "b.jpg", "c.jpg"])
+    session.commit()
+
+    deleted = []
+
+    def files_delete(keys):
+        deleted.extend(keys)
+        return {"b.jpg": "AccessDenied"}
+
+    monkeypatch.setattr(storage, "s3_files_delete", files_delete)
+    assert collect_garbage(session) == 3
+    assert sorted(deleted) == ["a.jpg", "b.jpg", "c.jpg"]
+
+    rows = queued(session)
+    assert list(rows) == ["b.jpg"]
+    assert rows["b.jpg"].attempts == 1
+    assert rows["b.jpg"].last_error == "AccessDenied"
+    assert rows["b.jpg"].not_before > datetime.datetime.utcnow()
+
+    # The failed key waits out its retry delay
+    assert collect_garbage(session) == 0
@@ -0,0 +1,55 @@
+from models.base import Category, Item, ItemCategory, Pack
+
+
+def ids(rows):
+    return sorted(row["id"] for row in rows)
+
+
+def test_full_sync_then_changes_only(client, session, user):
+    item = Item(user_id=user.id, name="Tent")
+    session.add(item)
+    session.commit()
+
+    full = client.get("/sync").json()
+    assert full["full"] is True
+    assert ids(full["items"]["upserts"]) == [item.id]
+
+    item.removed = True
+    session.commit()
+
+    delta = client.get("/sync", params={"since": full["token"]}).json()
+    assert delta["full"] is False
+    assert delta["items"] == {"upserts": [], "removed": [item.id]}
+
+
+def test_deleted_packs_drop_out_of_the_pack_ids(client, session, user):
+    kept, deleted = Pack(user_id=user.id, title="Kept"), Pack(user_id=user.id, title="Deleted")
+    session.add_all([kept, deleted])
+    session.commit()
+    token = client.get("/sync").json()["token"]
+
+    assert client.delete(f"/pack/{deleted.id}").status_code == 200
+
+    packs = client.get("/sync", params={"since": token}).json()["packs"]
+    assert packs["ids"] == [kept.id]
+
+
+def test_deleted_categories_drop_out_of_the_item_category_ids(client, session, user):
+    categories = [Category(name=name, user_id=user.id) for name in ("Shelter", "Kitchen")]
+    session.add_all(categories)
+    session.flush()
+    kept, deleted = [ItemCategory(user_id=user.id, category_id=category.id, sort_order=i)
+                     for i, category in enumerate(categories)]
+    session.add_all([kept, deleted])
+    session.flush()
+    item = Item(user_id=user.id, name="Stove", category_id=deleted.id)
+    session.add(item)
+    session.commit()
+    token = client.get("/sync").json()["token"]
+
+    assert client.delete(f"/category/{deleted.category_id}").status_code == 200
+
+    changes = client.get("/sync", params={"since": token}).json()
+    assert changes["item_categories"]["ids"] == [kept.id]
+    # Items left uncategorized come back as changed
+    assert [(row["id"], row["category_id"]) for row in changes["items"]["upserts"]] == [(item.id, None)]
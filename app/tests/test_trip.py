@@ -0,0 +1,70 @@
+import pytest
+
+from sqlalchemy import event
+
+from models.base import Pack, Trip
+from utils.trip_cache import info_cache
+
+
+@pytest.fixture
+def trip(session, user):
+    trip = Trip(user_id=user.id, title="Coast", published=False)
+    session.add(trip)
+    session.flush()
+    session.add(Pack(user_id=user.id, trip_id=trip.id, title="Overnight"))
+    session.commit()
+    return trip
+
+
+@pytest.fixture
+def statements(connection):
+    executed = []
+    listener = lambda *args: executed.append(args[2])
+    event.listen(connection, "before_cursor_execute", listener)
+    yield executed
+    event.remove(connection, "before_cursor_execute", listener)
+
+
+def test_info_validates_with_a_single_query(client, trip, statements):
+    info_cache.clear()
+    response = client.get(f"/trip/info/{trip.uuid}")
+    assert response.status_code == 200
+    assert [pack["title"] for pack in response.json()["packs"]] == ["Overnight"]
+    assert response.json()["user"]["username"] == "hiker"
+
+    statements.clear()
+    response = client.get(f"/trip/info/{trip.uuid}", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+    assert len([sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]) == 1
+
+
+def test_info_etag_changes_with_the_packs(client, session, trip):
+    info_cache.clear()
+    etag = client.get(f"/trip/info/{trip.uuid}").headers["ETag"]
+
+    session.add(Pack(user_id=trip.user_id, trip_id=trip.id, title="Day hike"))
+    session.commit()
+
+    response = client.get(f"/trip/info/{trip.uuid}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()["packs"]) == 2
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    trip_ids = []
+    monkeypatch.setattr("api.trip.invalidate_trip_caches", trip_ids.append)
+    return trip_ids
+
+
+def test_editing_an_unpublished_trip_keeps_the_public_caches(client, trip, invalidated):
+    response = client.put("/trip", json={"id": trip.id, "title": "Coast path"})
+    assert response.status_code == 200
+    assert invalidated == []
+
+
+def test_publishing_or_editing_a_published_trip_drops_the_public_caches(client, trip, invalidated):
+    client.put("/trip", json={"id": trip.id, "title": "Coast", "published": True})
+    client.put("/trip", json={"id": trip.id, "title": "Coast path"})
+    client.put("/trip", json={"id": trip.id, "title": "Coast path", "published": False})
+    assert invalidated == [trip.id] * 3
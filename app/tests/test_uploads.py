@@ -0,0 +1,94 @@
+import datetime
+
+import pytest
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from models.base import Image
+from utils import assets, uploads
+from utils.storage import StorageDeletion
+from utils.uploads import claim_upload, pending_s3, presign_upload, process_upload
+
+AVATAR = {"original": {"extension": ".jpg", "content_type": "image/jpeg", "data": b"data"}, "variants": []}
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    """Fake the bucket: every upload has arrived and every write succeeds."""
+    monkeypatch.setattr(uploads, "s3_presigned_post", lambda *args: {"url": "https://bucket", "fields": {}})
+    monkeypatch.setattr(uploads, "s3_file_size", lambda key: 1024)
+    monkeypatch.setattr(uploads, "s3_file_download", lambda key: b"photo")
+    monkeypatch.setattr(uploads, "notify_storage_gc", lambda: None)
+    monkeypatch.setattr(uploads, "invalidate_user", lambda user_id: None)
+    monkeypatch.setattr(assets, "transform", lambda fn, data, timeout=None: AVATAR)
+    monkeypatch.setattr(assets, "s3_files_upload", lambda uploads: True)
+
+
+def cleanup(session, key):
+    return session.scalars(select(StorageDeletion).where(StorageDeletion.key == key)).all()
+
+
+def test_signed_uploads_are_cleaned_up_unless_finalized(session, user, bucket):
+    key = presign_upload(session, user.id, "image/jpeg")["key"]
+
+    queued, = cleanup(session, key)
+    assert queued.not_before > datetime.datetime.utcnow()
+
+    claim_upload(session, user.id, key)
+    assert cleanup(session, key) == []
+
+
+def test_uploads_are_finalized_only_once(session, user, bucket):
+    key = presign_upload(session, user.id, "image/jpeg")["key"]
+    claim_upload(session, user.id, key)
+
+    with pytest.raises(HTTPException):
+        claim_upload(session, user.id, key)
+
+
+def test_expired_uploads_cannot_be_finalized(session, user, bucket):
+    key = presign_upload(session, user.id, "image/jpeg")["key"]
+    session.execute(update(StorageDeletion).where(StorageDeletion.key == key)
+                    .values(not_before=datetime.datetime.utcnow()))
+
+    with pytest.raises(HTTPException):
+        claim_upload(session, user.id, key)
+
+
+def test_uploads_of_other_users_are_rejected(session, user, bucket):
+    key = presign_upload(session, user.id, "image/jpeg")["key"]
+
+    with pytest.raises(HTTPException):
+        claim_upload(session, user.id + 1, key)
+
+
+def pending_avatar(session, user, key="uploads/1/abc"):
+    avatar = Image(user_id=user.id, avatar=False, s3=pending_s3('avatar', key))
+    session.add(avatar)
+    session.commit()
+    return avatar
+
+
+def test_avatar_replaces_the_current_one_once_processed(session, user, bucket, background_db):
+    avatar = pending_avatar(session, user)
+
+    process_upload(avatar.id, "uploads/1/abc")
+
+    session.expire_all()
+    assert avatar.avatar is True
+    assert avatar.s3["key"] == f"avatar/{avatar.id}.jpg"
+    assert [row.key for row in cleanup(session, "uploads/1/abc")] == ["uploads/1/abc"]
+
+
+def test_failed_avatar_stays_hidden_and_its_original_is_removed(session, user, bucket, background_db,
+                                                                 monkeypatch):
+    monkeypatch.setattr(uploads, "s3_file_download", lambda key: None)
+    avatar = pending_avatar(session, user)
+
+    process_upload(avatar.id, "uploads/1/abc")
+
+    session.expire_all()
+    assert avatar.avatar is False
+    assert avatar.s3["status"] == "failed"
+    assert [row.key for row in cleanup(session, "uploads/1/abc")] == ["uploads/1/abc"]
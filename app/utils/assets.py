@@ -0,0 +1,148 @@
+import datetime
+import hashlib
+
+from collections import Counter
+from fastapi import HTTPException
+from sqlalchemy import JSON, Column, DateTime, Integer, String, UniqueConstraint, column, delete, update, values
+from sqlalchemy.dialects.postgresql import insert
+
+from models.base import Base
+from utils.consts import IMAGE_QUEUE_TIMEOUT
+from utils.digital_ocean import s3_files_copy, s3_files_upload
+from utils.images import process_avatar, process_trip_photo, storage_uploads, transform
+from utils.storage import enqueue_deletion, image_keys, notify_storage_gc
+
+PROCESSORS = {'trip': process_trip_photo, 'avatar': process_avatar}
+
+
+class ImageAsset(Base):
+    """Processed renditions of one uploaded file, shared by every Image with that content."""
+    __tablename__ = 'image_asset'
+    __table_args__ = (UniqueConstraint('hash', 'entity', name='image_asset_hash_entity_key'),)
+
+    id = Column(Integer, primary_key=True)
+    hash = Column(String(64), nullable=False)
+    entity = Column(String(16), nullable=False)
+    s3 = Column(JSON, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def asset_keys(s3):
+    keys = [s3.get('key'), s3.get('thumb_key')] + [variant['key'] for variant in s3.get('variants', [])]
+    return {key for key in keys if key}
+
+
+def claim_asset(session, digest, entity):
+    """Take a reference on the stored asset with this content, if there is one."""
+    return session.execute(
+        update(ImageAsset)
+        .where(ImageAsset.hash == digest, ImageAsset.entity == entity)
+        .values(ref_count=ImageAsset.ref_count + 1)
+        .returning(ImageAsset.id, ImageAsset.s3)
+        .execution_options(synchronize_session=False)).first()
+
+
+def register_asset(session, digest, entity, image):
+    """Record a freshly processed image as the asset for its content.
+
+    :return: the new asset id, or None when a concurrent upload registered it first
+    """
+    s3 = {field: image.s3[field] for field in ('extension', 'key', 'thumb_key', 'variants')}
+    return session.execute(
+        insert(ImageAsset).values(hash=digest, entity=entity, s3=s3, ref_count=1)
+        .on_conflict_do_nothing(index_elements=['hash', 'entity'])
+        .returning(ImageAsset.id)).scalar()
+
+
+def prepare_image(session, image, entity, data, timeout=IMAGE_QUEUE_TIMEOUT):
+    """Fill in `image.s3` for uploaded `data`, reusing stored renditions of identical uploads.
+
+    Duplicates skip decoding and encoding: they share the asset's variants and
+    get server-side copies of the fallback rendition and thumbnail under their
+    own keys, where `Image.s3_key` and `s3_key_thumb` point.
+
+    :return: (uploads, copies) still to be made in storage
+    """
+    digest = content_hash(data)
+    asset = claim_asset(session, digest, entity)
+    if asset:
+        image.s3 = {'extension': asset.s3['extension'], 'entity': entity, 'asset_id': asset.id}
+        image.s3 = dict(image.s3, key=image.s3_key,
+                        thumb_key=image.s3_key_thumb if asset.s3['thumb_key'] else None,
+                        variants=asset.s3['variants'])
+        copies = [(asset.s3['key'], image.s3['key'])]
+        if asset.s3['thumb_key']:
+            copies.append((asset.s3['thumb_key'], image.s3['thumb_key']))
+        return [], copies
+
+    processed = transform(PROCESSORS[entity], data, timeout=timeout)
+    image.s3 = {'extension': processed['original']['extension'], 'entity': entity}
+    uploads, variants = storage_uploads(image, processed)
+    image.s3 = dict(image.s3, key=image.s3_key,
+                    thumb_key=image.s3_key_thumb if 'thumb' in processed else None,
+                    variants=variants)
+
+    asset_id = register_asset(session, digest, entity, image)
+    if asset_id:
+        image.s3 = dict(image.s3, asset_id=asset_id)
+
+    return uploads, []
+
+
+def store_image(session, image, entity, data, timeout=IMAGE_QUEUE_TIMEOUT):
+    """Process or reuse an image's renditions, store them and commit the image.
+
+    Nothing is committed when storage fails; objects already written are queued
+    for deletion instead.
+    """
+    session.flush()
+    uploads, copies = prepare_image(session, image, entity, data, timeout=timeout)
+
+    if s3_files_upload(uploads) and s3_files_copy(copies):
+        session.commit()
+        return
+
+    session.rollback()
+    enqueue_deletion(session, [key for _, _, key in uploads] + [key for _, key in copies])
+    session.commit()
+    notify_storage_gc()
+    raise HTTPException(400, "An error occurred while saving image.")
+
+
+def release_images(session, images):
+    """Drop the images' asset references and list the stored keys nobody uses any more.
+
+    Assets are released with one UPDATE ... FROM (VALUES ...) and the ones left
+    unreferenced are deleted along with their renditions. Nothing is committed here.
+    """
+    refs = Counter((image.s3 or {}).get('asset_id') for image in images)
+    refs.pop(None, None)
+
+    rows, shared, orphaned = [], set(), []
+    if refs:
+        released = values(column("id", Integer), column("refs", Integer),
+                          name="released").data(list(refs.items()))
+        rows = session.execute(
+            update(ImageAsset)
+            .where(ImageAsset.id == released.c.id)
+            .values(ref_count=ImageAsset.ref_count - released.c.refs)
+            .returning(ImageAsset.id, ImageAsset.ref_count, ImageAsset.s3)
+            .execution_options(synchronize_session=False)).all()
+
+        for row in rows:
+            shared |= asset_keys(row.s3)
+            if row.ref_count <= 0:
+                orphaned.append(row.id)
+
+        if orphaned:
+            session.execute(delete(ImageAsset).where(ImageAsset.id.in_(orphaned)))
+
+    keys = [key for image in images for key in image_keys(image)
+            if key not in shared]
+    keys += [key for row in rows if row.id in orphaned for key in asset_keys(row.s3)]
+    return list(dict.fromkeys(keys))
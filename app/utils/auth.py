@@ -1,10 +1,17 @@
+import hmac
 import jwt
 
 from fastapi import Header, HTTPException
 from fastapi_sqlalchemy import db
-from utils.consts import JWT_ALGORITHM, JWT_SECRET
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from utils.cache import TTLCache
+from utils.consts import ADMIN_TOKEN, DEVELOPMENT, JWT_ALGORITHM, JWT_SECRET, USER_CACHE_SIZE, USER_CACHE_TTL
 from models.base import User
 
+# Column snapshots of authenticated users, keyed by user id
+user_cache = TTLCache('user', maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 
 def authenticate(*, Authorization: str = Header(None)):
     if not Authorization or not Authorization.startswith("Bearer "):
@@ -19,15 +26,47 @@ def authenticate(*, Authorization: str = Header(None)):
         raise HTTPException(
             status_code=400, detail="Invalid or missing token.")
 
+    user_id = decoded_token['user_id']
+    snapshot = user_cache.get(user_id)
+    if snapshot:
+        return attach_cached_user(snapshot)
+
     # Fetch user from token payload
-    user = db.session.query(User).filter_by(
-        id=decoded_token['user_id']).first()
+    user = db.session.query(User).filter_by(id=user_id).first()
     if not user:
         raise HTTPException(status_code=400, detail="Account does not exist.")
 
+    user_cache.set(user_id, snapshot_user(user))
+
     return user
 
 
+def authenticate_admin(*, Authorization: str = Header(None)):
+    """Guard operational endpoints: open in development, otherwise ADMIN_TOKEN is required."""
+    if DEVELOPMENT:
+        return
+
+    expected = f"Bearer {ADMIN_TOKEN}"
+    if not ADMIN_TOKEN or not Authorization or not hmac.compare_digest(Authorization, expected):
+        raise HTTPException(status_code=403, detail="Permission denied.")
+
+
+def snapshot_user(user):
+    """Copy a user's column values so they can outlive the session."""
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+def attach_cached_user(snapshot):
+    """Rebuild a user from a snapshot and attach it to the session without a SELECT."""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    user_cache.invalidate(user_id)
+
+
 def generate_jwt(user):
     return jwt.encode({"user_id": user.id}, JWT_SECRET, JWT_ALGORITHM)
 
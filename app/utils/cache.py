@@ -0,0 +1,74 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+# Registry of named caches, exposed through the cache stats endpoint
+caches = {}
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Each process holds its own copy, so writers must call `invalidate` for
+    the entries they change and rely on the TTL to bound staleness elsewhere.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry for which `predicate(key, value)` is true."""
+        with self._lock:
+            for key in [key for key, entry in self._data.items() if predicate(key, entry[1])]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
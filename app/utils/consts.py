@@ -12,15 +12,46 @@ DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST
 APP_HOST = os.getenv('APP_HOST')
 JWT_SECRET = os.getenv('JWT_SECRET')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM')
+# Bearer token for operational endpoints such as cache stats; unset disables them outside development
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 DO_REGION = os.getenv('DO_REGION')
 DO_ACCESS_TOKEN = os.getenv('DO_ACCESS_TOKEN')
 DO_SPACES_KEY = os.getenv('DO_SPACES_KEY')
 DO_SPACES_SECRET_KEY = os.getenv('DO_SPACES_SECRET_KEY')
 DO_BUCKET = os.getenv('DO_BUCKET')
 DO_CDN = os.getenv('DO_CDN')
+# Point at MinIO or moto to exercise storage locally
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL', 'https://nyc3.digitaloceanspaces.com')
 
 MAILCHIMP_API_KEY = os.getenv('MAILCHIMP_API_KEY')
 MAILCHIMP_AUDIENCE_ID = os.getenv('MAILCHIMP_AUDIENCE_ID')
 MANDRILL_API_KEY = os.getenv('MANDRILL_API_KEY')
 MAILGUN_API_KEY = os.getenv('MAILGUN_API_KEY')
 MAILGUN_SENDING_DOMAIN = os.getenv('MAILGUN_SENDING_DOMAIN')
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 2048))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+
+IMPORT_JOB_STORE = os.getenv('IMPORT_JOB_STORE', 'memory')
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 2))
+# Background imports queued or running per process, overall and per user
+IMPORT_MAX_PENDING = int(os.getenv('IMPORT_MAX_PENDING', 20))
+IMPORT_MAX_PENDING_PER_USER = int(os.getenv('IMPORT_MAX_PENDING_PER_USER', 2))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_QUEUE_LIMIT = int(os.getenv('IMAGE_QUEUE_LIMIT', 8))
+IMAGE_QUEUE_TIMEOUT = float(os.getenv('IMAGE_QUEUE_TIMEOUT', 10))
+S3_UPLOAD_WORKERS = int(os.getenv('S3_UPLOAD_WORKERS', 8))
+
+# Responsive image variants written next to the fallback rendition, e.g. "webp,avif"
+IMAGE_FORMATS = [fmt.strip().upper() for fmt in os.getenv('IMAGE_FORMATS', 'webp').split(',') if fmt.strip()]
+IMAGE_WIDTHS = [int(width) for width in os.getenv('IMAGE_WIDTHS', '250,640,1000,2000').split(',') if width.strip()]
+
+UPLOAD_URL_EXPIRY = int(os.getenv('UPLOAD_URL_EXPIRY', 600))
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 25 * 1024 * 1024))
+# Seconds after signing that an upload can be finalized; originals never finalized are deleted
+# afterwards. Keep it above UPLOAD_URL_EXPIRY.
+UPLOAD_FINALIZE_WINDOW = int(os.getenv('UPLOAD_FINALIZE_WINDOW', 3600))
+
+STORAGE_GC_INTERVAL = int(os.getenv('STORAGE_GC_INTERVAL', 30))
+STORAGE_GC_MAX_ATTEMPTS = int(os.getenv('STORAGE_GC_MAX_ATTEMPTS', 10))
@@ -1,10 +1,12 @@
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-from utils.consts import DO_REGION, DO_SPACES_KEY, DO_SPACES_SECRET_KEY, DO_BUCKET
+from utils.consts import DO_REGION, DO_SPACES_KEY, DO_SPACES_SECRET_KEY, DO_BUCKET, S3_UPLOAD_WORKERS, \
+    S3_ENDPOINT_URL
 
 s3_client = boto3.client(
     's3',
-    endpoint_url='https://nyc3.digitaloceanspaces.com',
+    endpoint_url=S3_ENDPOINT_URL,
     aws_access_key_id=DO_SPACES_KEY,
     aws_secret_access_key=DO_SPACES_SECRET_KEY,
     region_name=DO_REGION
@@ -33,6 +35,22 @@ def s3_file_upload(file, content_type, key, bucket=DO_BUCKET):
     return True
 
 
+upload_executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS,
+                                     thread_name_prefix='s3-upload')
+
+
+def s3_files_upload(uploads, bucket=DO_BUCKET):
+    """Upload several files concurrently
+
+    :param uploads: list of (file, content_type, key) tuples
+    :param bucket: Bucket to upload to
+    :return: True if every file was uploaded, else False
+    """
+    futures = [upload_executor.submit(s3_file_upload, file, content_type, key, bucket)
+               for file, content_type, key in uploads]
+    return all([future.result() for future in futures])
+
+
 def s3_file_delete(key):
     try:
         s3_client.delete_object(Bucket=DO_BUCKET, Key=key)
@@ -41,3 +59,85 @@ def s3_file_delete(key):
         return False
 
     return True
+
+
+def s3_presigned_post(key, content_type, max_size, expires_in, bucket=DO_BUCKET):
+    """Sign a form upload of a single object straight to the bucket
+
+    :param key: Path-like string the object must be stored at
+    :param content_type: Content type the upload must declare
+    :param max_size: Largest accepted upload in bytes
+    :param expires_in: Seconds the signature stays valid
+    :return: dict with the form `url` and `fields`, else None
+    """
+    try:
+        return s3_client.generate_presigned_post(
+            bucket, key,
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type},
+                        ['content-length-range', 1, max_size]],
+            ExpiresIn=expires_in)
+    except ClientError as e:
+        print(e)
+        return None
+
+
+def s3_file_download(key, bucket=DO_BUCKET):
+    try:
+        return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except ClientError as e:
+        print(e)
+        return None
+
+
+def s3_file_size(key, bucket=DO_BUCKET):
+    """Size of a stored object in bytes, or None if it does not exist."""
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    except ClientError as e:
+        print(e)
+        return None
+
+
+def s3_files_delete(keys, bucket=DO_BUCKET):
+    """Delete up to 1000 objects with a single request
+
+    :param keys: Object keys to delete
+    :param bucket: Bucket to delete from
+    :return: dict of keys that could not be deleted to their error
+    """
+    try:
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+    except ClientError as e:
+        print(e)
+        return {key: str(e) for key in keys}
+
+    return {error['Key']: error.get('Message', error.get('Code'))
+            for error in response.get('Errors', [])}
+
+
+def s3_file_copy(source, key, bucket=DO_BUCKET):
+    try:
+        s3_client.copy_object(CopySource={'Bucket': bucket, 'Key': source},
+                              Bucket=bucket,
+                              Key=key,
+                              ACL='public-read')
+    except ClientError as e:
+        print(e)
+        return False
+
+    return True
+
+
+def s3_files_copy(copies, bucket=DO_BUCKET):
+    """Copy several objects within the bucket concurrently, without downloading them
+
+    :param copies: list of (source key, destination key) tuples
+    :param bucket: Bucket holding both keys
+    :return: True if every object was copied, else False
+    """
+    futures = [upload_executor.submit(s3_file_copy, source, key, bucket)
+               for source, key in copies]
+    return all([future.result() for future in futures])
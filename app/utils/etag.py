@@ -0,0 +1,72 @@
+import datetime
+import hashlib
+import json
+
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Response
+from sqlalchemy import func, select
+
+from models.base import Item, ItemCategory, Pack
+
+
+def packs_version(user_id, *where):
+    """Scalar subqueries validating a user's packs matching `where` and the items they show.
+
+    Pack item writes bump their pack's updated_at and removing an item bumps
+    its own, so counts and latest timestamps cover every change without
+    reading the rows themselves. `user_id` and `where` may refer to columns of
+    an enclosing statement, which the subqueries then correlate to.
+    """
+    packs = [Pack.user_id == user_id, *where]
+    return [
+        select(func.count(Pack.id)).where(*packs).scalar_subquery(),
+        select(func.max(Pack.updated_at)).where(*packs).scalar_subquery(),
+        select(func.max(Item.updated_at)).where(Item.user_id == user_id).scalar_subquery(),
+        select(func.max(ItemCategory.updated_at)).where(ItemCategory.user_id == user_id).scalar_subquery(),
+    ]
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(json.dumps(
+        parts, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def to_utc(value):
+    """Treat naive datetimes, as stored by the models, as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def http_date(value):
+    return format_datetime(to_utc(value), usegmt=True)
+
+
+def not_modified(request, response, etag, last_modified=None):
+    """Attach validators to `response` and check the request's conditional headers.
+
+    Returns a 304 response when the client's copy is current, otherwise None
+    so the caller goes on to build the full payload.
+    """
+    headers = {"ETag": etag}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        matched = "*" in tags or etag in tags or f"W/{etag}" in tags
+    elif if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            matched = to_utc(last_modified).replace(microsecond=0) <= to_utc(since)
+        except (TypeError, ValueError):
+            matched = False
+    else:
+        matched = False
+
+    return Response(status_code=304, headers=headers) if matched else None
@@ -0,0 +1,116 @@
+import csv
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from io import StringIO
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.base import Item, ItemCategory, Category, Brand, Product, PackItem
+
+EXPORT_CHUNK_SIZE = 1000
+
+LIGHTERPACK_UNITS = {"g": "gram", "kg": "kilogram", "oz": "ounce", "lb": "pound"}
+
+MEDIA_TYPES = {
+    "packstack": "text/csv",
+    "lighterpack": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+EXTENSIONS = {"packstack": "csv", "lighterpack": "csv", "ndjson": "ndjson"}
+
+
+def item_export_query():
+    """Items joined with the names the CSV importers resolve them from."""
+    return select(Item.id,
+                  Item.name,
+                  Brand.name.label("manufacturer"),
+                  Product.name.label("product"),
+                  Category.name.label("category"),
+                  Item.weight,
+                  Item.unit,
+                  Item.price,
+                  Item.consumable,
+                  Item.product_url,
+                  Item.notes) \
+        .select_from(Item) \
+        .outerjoin(Brand, Brand.id == Item.brand_id) \
+        .outerjoin(Product, Product.id == Item.product_id) \
+        .outerjoin(ItemCategory, ItemCategory.id == Item.category_id) \
+        .outerjoin(Category, Category.id == ItemCategory.category_id)
+
+
+def user_items_query(user_id):
+    return item_export_query() \
+        .where(Item.user_id == user_id, Item.removed == False) \
+        .order_by(Item.id)
+
+
+def pack_items_query(pack_id):
+    return item_export_query() \
+        .add_columns(PackItem.quantity, PackItem.worn, PackItem.checked) \
+        .join(PackItem, PackItem.item_id == Item.id) \
+        .where(PackItem.pack_id == pack_id) \
+        .order_by(PackItem.sort_order, Item.id)
+
+
+def packstack_row(row):
+    return [row.name, row.manufacturer, row.product, row.category, row.weight, row.unit,
+            row.price, "TRUE" if row.consumable else "", row.product_url, row.notes]
+
+
+def lighterpack_row(row):
+    mapping = row._mapping
+    return [row.name, row.category, row.notes, mapping.get("quantity") or 1, row.weight,
+            LIGHTERPACK_UNITS.get(row.unit, row.unit), row.product_url, row.price,
+            "Worn" if mapping.get("worn") else "", "Consumable" if row.consumable else ""]
+
+
+CSV_FORMATS = {
+    "packstack": (["name", "manufacturer", "product", "category", "weight", "unit",
+                   "price", "consumable", "product_url", "notes"], packstack_row),
+    "lighterpack": (["Item Name", "Category", "desc", "qty", "weight", "unit",
+                     "url", "price", "worn", "consumable"], lighterpack_row)
+}
+
+
+def stream_export(bind, stmt, export_format):
+    """Yield an export chunk by chunk from a server-side cursor.
+
+    Runs in its own session because the response body is sent after the
+    request's session has been closed.
+    """
+    with Session(bind) as session:
+        result = session.execute(
+            stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+        if export_format == "ndjson":
+            for partition in result.partitions():
+                yield "".join(json.dumps(row._asdict(), default=str) + "\n"
+                              for row in partition)
+            return
+
+        header, to_row = CSV_FORMATS[export_format]
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        yield buffer.getvalue()
+
+        for partition in result.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(to_row(row) for row in partition)
+            yield buffer.getvalue()
+
+
+def export_response(bind, stmt, export_format, filename):
+    if export_format not in MEDIA_TYPES:
+        raise HTTPException(
+            400, "Format must be one of: packstack, lighterpack, ndjson")
+
+    disposition = f'attachment; filename="{filename}.{EXTENSIONS[export_format]}"'
+    return StreamingResponse(stream_export(bind, stmt, export_format),
+                             media_type=MEDIA_TYPES[export_format],
+                             headers={"Content-Disposition": disposition})
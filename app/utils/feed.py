@@ -0,0 +1,111 @@
+import datetime
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.encoders import jsonable_encoder
+from fastapi_sqlalchemy import db
+from sqlalchemy import select, tuple_
+
+from models.base import Trip
+from utils.cache import TTLCache
+from utils.pagination import decode_cursor, encode_cursor, page_size
+
+LEGACY_FEED_SIZE = 35
+FEED_CACHE_SIZE = 500
+
+# Cards for the newest published trips, newest first
+feed_cache = TTLCache('trip_feed', maxsize=1, ttl=300)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed')
+_lock = threading.Lock()
+_generation = [0]
+
+
+def feed_query(now, cursor=None):
+    """Published, finished trips ordered by (end_date, id), newest first."""
+    stmt = select(Trip).where(
+        Trip.end_date != None,
+        Trip.end_date <= now,
+        Trip.removed == False,
+        Trip.published == True)
+    if cursor:
+        stmt = stmt.where(tuple_(Trip.end_date, Trip.id) < tuple(cursor))
+    return stmt.order_by(Trip.end_date.desc(), Trip.id.desc())
+
+
+def feed_key(trip):
+    """A trip's (end_date, id) sort key, with a date end_date promoted to a datetime."""
+    end_date = trip.end_date
+    if not isinstance(end_date, datetime.datetime):
+        end_date = datetime.datetime.combine(end_date, datetime.time())
+    return end_date, trip.id
+
+
+def feed_cards(trips):
+    return [(*feed_key(trip), jsonable_encoder(trip)) for trip in trips]
+
+
+def build_cards(session):
+    now = datetime.datetime.utcnow()
+    return feed_cards(session.scalars(feed_query(now).limit(FEED_CACHE_SIZE)))
+
+
+def cached_cards(session):
+    cards = feed_cache.get('cards')
+    if cards is None:
+        generation = _generation[0]
+        cards = build_cards(session)
+        store_cards(cards, generation)
+    return cards
+
+
+def store_cards(cards, generation):
+    # Skip results computed before the most recent invalidation
+    with _lock:
+        if generation == _generation[0]:
+            feed_cache.set('cards', cards)
+
+
+def rebuild_feed():
+    generation = _generation[0]
+    try:
+        with db():
+            store_cards(build_cards(db.session), generation)
+    except Exception as e:
+        print(e)
+
+
+def invalidate_feed():
+    """Drop the cached feed and rebuild it in the background."""
+    with _lock:
+        _generation[0] += 1
+        feed_cache.invalidate('cards')
+    _executor.submit(rebuild_feed)
+
+
+def feed_page(session, cursor=None, limit=None):
+    """Serve a feed page from the cached cards, querying only past their end.
+
+    :return: (cards, next cursor) for the page
+    """
+    limit = LEGACY_FEED_SIZE if limit is None and cursor is None else page_size(limit)
+    after = decode_cursor(cursor, 2) if cursor else None
+    now = datetime.datetime.utcnow()
+
+    # Cards were filtered on end_date in SQL when they were built
+    cards = cached_cards(session)
+    page = [card for card in cards
+            if after is None or (card[0], card[1]) < tuple(after)][:limit + 1]
+
+    # The cache only holds the newest trips; read deeper pages from the index
+    if len(page) <= limit and len(cards) >= FEED_CACHE_SIZE:
+        last = page[-1][:2] if page else after
+        remaining = limit + 1 - len(page)
+        page += feed_cards(session.scalars(feed_query(now, last).limit(remaining)))
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(list(page[-1][:2]))
+
+    return [card[2] for card in page], next_cursor
@@ -0,0 +1,156 @@
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from fastapi import HTTPException
+from PIL import Image as PILImage, ImageOps
+
+from utils.consts import IMAGE_WORKERS, IMAGE_QUEUE_LIMIT, IMAGE_QUEUE_TIMEOUT, IMAGE_FORMATS, IMAGE_WIDTHS
+
+try:
+    # AVIF support comes from an optional Pillow plugin
+    import pillow_avif
+except ImportError:
+    pillow_avif = None
+
+PHOTO_SIZE = 1000
+THUMB_SIZE = 250
+AVATAR_SIZE = 400
+
+# Encoder settings per output format; JPEG and PNG only serve as fallbacks
+FORMAT_OPTIONS = {
+    'JPEG': {'extension': '.jpg', 'quality': 82, 'optimize': True, 'progressive': True},
+    'PNG': {'extension': '.png', 'optimize': True},
+    'WEBP': {'extension': '.webp', 'quality': 78, 'method': 4},
+    'AVIF': {'extension': '.avif', 'quality': 60},
+}
+
+# Configured variant formats this Pillow build can write
+VARIANT_FORMATS = [fmt for fmt in IMAGE_FORMATS if fmt in FORMAT_OPTIONS and fmt in PILImage.SAVE]
+
+_pool = []
+_pool_lock = threading.Lock()
+
+# Transforms running or waiting for a worker; further uploads wait briefly, then get a 503
+_slots = threading.BoundedSemaphore(IMAGE_WORKERS + IMAGE_QUEUE_LIMIT)
+
+
+def get_pool():
+    # Created on first use so importing the app does not start worker processes
+    with _pool_lock:
+        if not _pool:
+            _pool.append(ProcessPoolExecutor(max_workers=IMAGE_WORKERS))
+        return _pool[0]
+
+
+def transform(fn, data, timeout=IMAGE_QUEUE_TIMEOUT):
+    """Run an image transform in the process pool and wait for its result.
+
+    :param timeout: seconds to wait for a free slot; None waits indefinitely
+    """
+    if not _slots.acquire(timeout=timeout):
+        raise HTTPException(503, "Too many images are being processed, please try again.")
+
+    try:
+        return get_pool().submit(fn, data).result()
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise HTTPException(400, "An error occurred while processing image.")
+    finally:
+        _slots.release()
+
+
+def open_image(data, size):
+    """Decode an upload, letting JPEG sources decode straight to a reduced scale."""
+    img = PILImage.open(BytesIO(data))
+    source_format = img.format
+    img.draft(img.mode, (size, size))
+    img = ImageOps.exif_transpose(img)
+
+    # Photos keep their format as the fallback; everything else falls back to PNG
+    fallback = 'JPEG' if source_format == 'JPEG' else 'PNG'
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    if fallback == 'JPEG' or not has_alpha:
+        img = img.convert('RGB') if img.mode != 'RGB' else img
+    elif img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    return img, fallback
+
+
+def encode(img, fmt):
+    options = {key: value for key, value in FORMAT_OPTIONS[fmt].items() if key != 'extension'}
+    output = BytesIO()
+    img.save(output, format=fmt, **options)
+    return output.getvalue()
+
+
+def rendition(img, fmt):
+    return {
+        "format": fmt.lower(),
+        "width": img.width,
+        "height": img.height,
+        "extension": FORMAT_OPTIONS[fmt]['extension'],
+        "content_type": PILImage.MIME.get(fmt, f"image/{fmt.lower()}"),
+        "data": encode(img, fmt),
+    }
+
+
+def responsive_variants(img):
+    """Encode `img` in every variant format at each configured width it can fill."""
+    widths = sorted({min(width, img.width) for width in IMAGE_WIDTHS})
+    variants = []
+    for width in widths:
+        height = max(1, round(img.height * width / img.width))
+        resized = img if width == img.width else img.resize((width, height), PILImage.ANTIALIAS)
+        variants += [rendition(resized, fmt) for fmt in VARIANT_FORMATS]
+    return variants
+
+
+def process_trip_photo(data):
+    """Resize a trip photo into its fallback sizes and responsive variants; runs in a pool worker."""
+    img, fallback = open_image(data, max(IMAGE_WIDTHS + [PHOTO_SIZE]))
+    original = img.copy()
+    thumb = img.copy()
+
+    original.thumbnail([PHOTO_SIZE, PHOTO_SIZE], PILImage.ANTIALIAS)
+    thumb.thumbnail([THUMB_SIZE, THUMB_SIZE], PILImage.ANTIALIAS)
+
+    return {
+        "original": rendition(original, fallback),
+        "thumb": rendition(thumb, fallback),
+        "variants": responsive_variants(img),
+    }
+
+
+def process_avatar(data):
+    img, fallback = open_image(data, AVATAR_SIZE)
+    img = img.resize([AVATAR_SIZE, AVATAR_SIZE], PILImage.ANTIALIAS)
+    return {"original": rendition(img, fallback), "variants": responsive_variants(img)}
+
+
+def variant_key(image, variant):
+    return f"{os.path.splitext(image.s3_key)[0]}-{variant['width']}{variant['extension']}"
+
+
+def storage_uploads(image, processed):
+    """Pair processed renditions with their keys for an image whose s3 info is set.
+
+    :return: (uploads for s3_files_upload, variant records for `Image.s3`)
+    """
+    uploads = [(BytesIO(processed["original"]["data"]), processed["original"]["content_type"], image.s3_key)]
+    if "thumb" in processed:
+        uploads.append((BytesIO(processed["thumb"]["data"]),
+                        processed["thumb"]["content_type"], image.s3_key_thumb))
+
+    variants = []
+    for variant in processed["variants"]:
+        key = variant_key(image, variant)
+        uploads.append((BytesIO(variant["data"]), variant["content_type"], key))
+        variants.append({"key": key, **{field: variant[field] for field in
+                                        ("format", "width", "height", "content_type")}})
+
+    return uploads, variants
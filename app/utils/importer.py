@@ -0,0 +1,204 @@
+import codecs
+import csv
+
+from io import StringIO
+from sqlalchemy import insert
+
+from models.base import Item
+from utils.resolver import resolve_brands, resolve_products, resolve_categories, resolve_item_categories
+from utils.weight import standardize_weight_unit
+
+IMPORT_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+
+
+def normalize_row(row):
+    """Lowercase and strip CSV headers, strip values."""
+    return dict((k.lower().strip(), (v or '').strip()) for k, v in row.items() if k)
+
+
+def iter_lines(file, encoding='utf-8'):
+    """Decode a binary file object chunk by chunk into lines, keeping their line endings.
+
+    Only `read()` is needed, so uploads spooled by Starlette can be passed as is;
+    TextIOWrapper needs `readable()`, which SpooledTemporaryFile lacks before Python 3.11.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        pending += decoder.decode(chunk, final=not chunk)
+        # Split like open(newline=''): on \n, \r and \r\n, without translating them
+        lines = StringIO(pending, newline='').readlines()
+        # A line without \n may still continue, or be a \r followed by \n, in the next chunk
+        pending = lines.pop() if chunk and lines and not lines[-1].endswith('\n') else ''
+        yield from lines
+        if not chunk:
+            return
+
+
+def iter_csv_rows(file, encoding='utf-8'):
+    """Yield normalized rows from a binary file object, reading it incrementally."""
+    for row in csv.DictReader(iter_lines(file, encoding)):
+        yield normalize_row(row)
+
+
+def generate_error(line, message):
+    return dict({'line': line + 2, 'error': message})
+
+
+def parse_common(row, entry):
+    """Validate the unit/weight/price fields shared by every import format."""
+    unit = row.get("unit")
+    weight = row.get("weight")
+    price = row.get("price", None)
+
+    if unit:
+        unit = standardize_weight_unit(unit)
+
+    if weight:
+        try:
+            weight = float(weight)
+        except Exception:
+            raise ValueError("Invalid weight value.")
+    else:
+        weight = None
+
+    if price:
+        try:
+            price = float(price)
+        except Exception:
+            raise ValueError("Invalid price value.")
+    else:
+        price = None
+
+    entry.update(unit=unit, weight=weight, price=price,
+                 consumable=bool(row.get("consumable", None)))
+    return entry
+
+
+def parse_lighterpack_row(row):
+    if not row.get("item name"):
+        return None
+
+    return parse_common(row, dict(name=row.get("item name"),
+                                  category=row.get("category"),
+                                  product_url=row.get("url"),
+                                  notes=row.get("desc")))
+
+
+def parse_csv_row(row):
+    if not row.get("name"):
+        return None
+
+    return parse_common(row, dict(name=row.get("name"),
+                                  brand=row.get("manufacturer"),
+                                  product=row.get("product"),
+                                  category=row.get("category"),
+                                  product_url=row.get("product_url"),
+                                  notes=row.get("notes", None)))
+
+
+def parse_rows(rows, parse_row):
+    """Validate rows, returning (entries, errors). Rows without a name are skipped."""
+    entries = []
+    errors = []
+    for i, row in enumerate(rows):
+        try:
+            entry = parse_row(row)
+        except Exception as e:
+            errors.append(generate_error(i, str(e)))
+            continue
+
+        if entry:
+            entries.append(entry)
+
+    return entries, errors
+
+
+def import_entries(session, user_id, entries):
+    """Resolve the names referenced by parsed entries and bulk insert them as items.
+
+    Every distinct brand, product and category is resolved with a single query
+    and missing ones are created in bulk; nothing is committed here.
+    """
+    if not entries:
+        return 0
+
+    brands = resolve_brands(session, [e.get("brand") for e in entries])
+
+    def brand_id(entry):
+        return brands.get((entry.get("brand") or '').lower())
+
+    products = resolve_products(
+        session, [(brand_id(e), e.get("product")) for e in entries])
+    categories = resolve_categories(
+        session, [e.get("category") for e in entries], user_id)
+    item_categories = resolve_item_categories(
+        session, categories.values(), user_id)
+
+    items = []
+    for entry in entries:
+        category_id = categories.get((entry.get("category") or '').lower())
+        items.append(dict(user_id=user_id,
+                          brand_id=brand_id(entry),
+                          product_id=products.get(
+                              (brand_id(entry), (entry.get("product") or '').lower())),
+                          category_id=item_categories.get(category_id),
+                          name=entry["name"],
+                          weight=entry["weight"],
+                          unit=entry["unit"],
+                          price=entry["price"],
+                          product_url=entry["product_url"],
+                          notes=entry["notes"],
+                          consumable=entry["consumable"]))
+
+    session.execute(insert(Item), items)
+    return len(items)
+
+
+def stream_import(session, user_id, rows, parse_row, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Validate rows lazily and insert them in fixed-size batches.
+
+    Only one batch of entries is held in memory at a time. Once a row fails,
+    the remaining rows are still validated but no longer inserted, since the
+    caller is expected to roll the transaction back. `progress`, if given, is
+    called with (rows processed, items inserted, errors, error count) after
+    every `batch_size` rows.
+
+    :return: tuple of (items inserted, first errors, total error count)
+    """
+    count = 0
+    errors = []
+    error_count = 0
+    batch = []
+    processed = 0
+    for i, row in enumerate(rows):
+        processed = i + 1
+        if progress and i and i % batch_size == 0:
+            progress(i, count, errors, error_count)
+
+        try:
+            entry = parse_row(row)
+        except Exception as e:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(generate_error(i, str(e)))
+            continue
+
+        if not entry or error_count:
+            continue
+
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            count += import_entries(session, user_id, batch)
+            batch = []
+
+    if batch and not error_count:
+        count += import_entries(session, user_id, batch)
+
+    if progress:
+        progress(processed, count, errors, error_count)
+
+    return count, errors, error_count
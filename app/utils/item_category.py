@@ -1,25 +1,14 @@
 from fastapi import HTTPException
-from models.base import ItemCategory
+from utils.resolver import resolve_item_categories
 
-def get_or_create_item_category(session, category_id, user_id):
-    item_category = session.query(ItemCategory).filter_by(
-        category_id=category_id, user_id=user_id).first()
-
-    if item_category:
-        return item_category.id
 
-    # Create Item Category
-    position = session.query(
-        ItemCategory).filter_by(user_id=user_id).count()
-    new_item_category = ItemCategory(
-        category_id=category_id, user_id=user_id, sort_order=position)
+def get_or_create_item_category(session, category_id, user_id):
+    """Return the user's item category id for a category, creating it if needed.
 
+    A new item category is flushed but not committed, so it commits with the
+    caller's transaction.
+    """
     try:
-        session.add(new_item_category)
-        session.commit()
-        session.refresh(new_item_category)
-    except:
+        return resolve_item_categories(session, [category_id], user_id)[category_id]
+    except Exception:
         raise HTTPException(400, "An error occurred while creating category.")
-
-    return new_item_category.id
-    
\ No newline at end of file
@@ -0,0 +1,170 @@
+import datetime
+import threading
+import uuid
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from fastapi_sqlalchemy import db
+from sqlalchemy import Column, DateTime, Integer, JSON, String, update
+
+from models.base import Base
+from utils.consts import IMPORT_JOB_STORE, IMPORT_MAX_PENDING, IMPORT_MAX_PENDING_PER_USER, IMPORT_WORKERS
+from utils.importer import iter_csv_rows, stream_import
+
+
+class ImportJob(Base):
+    __tablename__ = 'import_job'
+
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    kind = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False, default='queued')
+    rows = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON, nullable=False, default=list)
+    detail = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow,
+                        onupdate=datetime.datetime.utcnow)
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class JobStore:
+    """Interface for persisting import job progress."""
+
+    def create(self, user_id, kind):
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Keeps the most recent jobs in process memory.
+
+    Only suitable when a single API process serves both the upload and the
+    progress polling.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, user_id, kind):
+        now = datetime.datetime.utcnow()
+        job = dict(id=str(uuid.uuid4()), user_id=user_id, kind=kind, status='queued',
+                   rows=0, count=0, error_count=0, errors=[], detail=None,
+                   created_at=now, updated_at=now)
+        with self._lock:
+            self._jobs[job['id']] = job
+            while len(self._jobs) > self.maxsize:
+                self._jobs.popitem(last=False)
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields, updated_at=datetime.datetime.utcnow())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class PostgresJobStore(JobStore):
+    """Persists jobs in the `import_job` table so any API process can report them."""
+
+    def create(self, user_id, kind):
+        job = ImportJob(id=str(uuid.uuid4()), user_id=user_id, kind=kind,
+                        status='queued', rows=0, count=0, error_count=0, errors=[])
+        with db(commit_on_exit=True):
+            db.session.add(job)
+            db.session.flush()
+            return job.to_dict()
+
+    def update(self, job_id, **fields):
+        with db(commit_on_exit=True):
+            db.session.execute(update(ImportJob).where(
+                ImportJob.id == job_id).values(**fields))
+
+    def get(self, job_id):
+        with db():
+            job = db.session.get(ImportJob, job_id)
+            return job.to_dict() if job else None
+
+
+job_store = PostgresJobStore() if IMPORT_JOB_STORE == 'postgres' else MemoryJobStore()
+executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS,
+                              thread_name_prefix='import')
+
+# Imports queued or running in this process, per user; each holds a spooled upload
+_pending = Counter()
+_pending_lock = threading.Lock()
+
+
+def reserve_import(user_id):
+    """Count an import against the pending caps, or turn it away with a 429."""
+    with _pending_lock:
+        if _pending[user_id] >= IMPORT_MAX_PENDING_PER_USER or \
+                sum(_pending.values()) >= IMPORT_MAX_PENDING:
+            raise HTTPException(429, "Too many imports are queued, please try again later.")
+        _pending[user_id] += 1
+
+
+def release_import(user_id):
+    with _pending_lock:
+        _pending[user_id] -= 1
+        if _pending[user_id] <= 0:
+            del _pending[user_id]
+
+
+def submit_import(user_id, kind, spool, parse_row):
+    """Queue an import of a spooled CSV file and return the job record.
+
+    The caller must already hold a slot from `reserve_import`; it is released
+    when the import finishes.
+    """
+    try:
+        job = job_store.create(user_id, kind)
+        executor.submit(run_import, job['id'], user_id, spool, parse_row)
+    except Exception:
+        release_import(user_id)
+        spool.close()
+        raise
+    return job
+
+
+def run_import(job_id, user_id, spool, parse_row):
+    def progress(rows, count, errors, error_count):
+        job_store.update(job_id, rows=rows, count=count,
+                         errors=errors, error_count=error_count)
+
+    job_store.update(job_id, status='running')
+    try:
+        with db():
+            count, errors, error_count = stream_import(
+                db.session, user_id, iter_csv_rows(spool), parse_row, progress=progress)
+
+            if errors:
+                db.session.rollback()
+                job_store.update(job_id, status='failed', count=0)
+            else:
+                db.session.commit()
+                job_store.update(job_id, status='completed', count=count)
+    except Exception as e:
+        print(e)
+        job_store.update(job_id, status='failed', count=0,
+                         detail='An unexpected error occurred while importing items.')
+    finally:
+        spool.close()
+        release_import(user_id)
@@ -0,0 +1,208 @@
+import datetime
+
+from sqlalchemy import Integer, bindparam, case, column, delete, func, insert, or_, select, update, values
+
+from models.base import Pack, PackItem, Item, ItemCategory, Category
+from utils.cache import TTLCache
+from utils.weight import conversion_factor_expr
+
+PACK_ITEM_FIELDS = ("quantity", "worn", "checked", "sort_order")
+
+# Weight summaries keyed by (owner id, pack id)
+summary_cache = TTLCache('pack_summary', maxsize=1024, ttl=600)
+
+
+def pack_item_rows(pack_id, items):
+    """Turn submitted pack items into rows keyed by item id; the last duplicate wins."""
+    rows = {}
+    for item in items or []:
+        rows[item.item_id] = dict(pack_id=pack_id, item_id=item.item_id,
+                                  **{field: getattr(item, field) for field in PACK_ITEM_FIELDS})
+    return rows
+
+
+def insert_pack_items(session, pack_id, items):
+    rows = list(pack_item_rows(pack_id, items).values())
+    if rows:
+        session.execute(insert(PackItem), rows)
+    return len(rows)
+
+
+def sync_pack_items(session, pack_id, items):
+    """Write only the differences between a pack's stored and submitted items.
+
+    New items are inserted, changed ones updated and missing ones deleted,
+    each with a single statement. Nothing is committed here.
+
+    :return: dict with the number of added, changed and removed items
+    """
+    submitted = pack_item_rows(pack_id, items)
+    stored = {row.item_id: row for row in session.execute(
+        select(PackItem.item_id, *[getattr(PackItem, field) for field in PACK_ITEM_FIELDS])
+        .where(PackItem.pack_id == pack_id))}
+
+    added = [row for item_id, row in submitted.items() if item_id not in stored]
+    changed = [row for item_id, row in submitted.items()
+               if item_id in stored and any(getattr(stored[item_id], field) != row[field]
+                                            for field in PACK_ITEM_FIELDS)]
+    removed = [item_id for item_id in stored if item_id not in submitted]
+
+    if removed:
+        session.execute(delete(PackItem).where(
+            PackItem.pack_id == pack_id, PackItem.item_id.in_(removed)))
+
+    if added:
+        session.execute(insert(PackItem), added)
+
+    if changed:
+        table = PackItem.__table__
+        stmt = update(table) \
+            .where(table.c.pack_id == bindparam("match_pack_id"),
+                   table.c.item_id == bindparam("match_item_id")) \
+            .values({field: bindparam(f"new_{field}") for field in PACK_ITEM_FIELDS})
+        session.execute(stmt, [dict(match_pack_id=row["pack_id"], match_item_id=row["item_id"],
+                                    **{f"new_{field}": row[field] for field in PACK_ITEM_FIELDS})
+                               for row in changed])
+
+    return {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+
+def clone_packs(session, where, **overrides):
+    """Copy the packs matching `where`, and all their pack items, without committing.
+
+    Packs go in as one multi-row INSERT ... RETURNING and their items as a
+    single INSERT ... SELECT, however many items the packs hold.
+
+    :param overrides: column values set on every copy, e.g. trip_id
+    :return: dict mapping source pack ids to their copies' ids
+    """
+    packs = Pack.__table__
+    columns = [c for c in packs.c if not c.primary_key]
+    sources = session.execute(select(packs.c.id, *columns).where(*where).order_by(packs.c.id)).all()
+    if not sources:
+        return {}
+
+    now = datetime.datetime.utcnow()
+    stamps = {name: now for name in ("created_at", "updated_at") if name in packs.c}
+    rows = [{**{c.key: getattr(source, c.key) for c in columns}, **stamps, **overrides}
+            for source in sources]
+    new_ids = session.execute(insert(packs).returning(packs.c.id, sort_by_parameter_order=True),
+                              rows).scalars().all()
+    id_map = dict(zip([source.id for source in sources], new_ids))
+
+    # Item ids are copied along with the rest; surrogate keys are regenerated
+    items = PackItem.__table__
+    copied = [c for c in items.c
+              if c.key != "pack_id" and (not c.primary_key or c.foreign_keys)]
+    copies = values(column("old_id", Integer), column("new_id", Integer),
+                    name="copies").data(list(id_map.items()))
+    session.execute(insert(items).from_select(
+        ["pack_id", *[c.key for c in copied]],
+        select(copies.c.new_id, *copied).select_from(items)
+        .join(copies, copies.c.old_id == items.c.pack_id)))
+
+    return id_map
+
+
+def weight_totals(weight):
+    """Total, base, worn and consumable sums of a converted pack item weight."""
+    def total(*where):
+        expr = func.sum(weight)
+        if where:
+            expr = expr.filter(*where)
+        return func.coalesce(expr, 0)
+
+    return (total().label("total"),
+            total(PackItem.worn.isnot(True), Item.consumable.isnot(True)).label("base"),
+            total(PackItem.worn.is_(True)).label("worn"),
+            total(Item.consumable.is_(True)).label("consumable"))
+
+
+def pack_summary(session, pack_id, unit):
+    """Compute a pack's weight totals per category, converted to `unit`, in one query."""
+    weight = Item.weight * conversion_factor_expr(Item.unit, unit) * \
+        func.coalesce(PackItem.quantity, 1)
+
+    rows = session.execute(
+        select(ItemCategory.id, Category.id.label("category_id"), Category.name,
+               func.count().label("items"), *weight_totals(weight))
+        .select_from(PackItem)
+        .join(Item, Item.id == PackItem.item_id)
+        .outerjoin(ItemCategory, ItemCategory.id == Item.category_id)
+        .outerjoin(Category, Category.id == ItemCategory.category_id)
+        .where(PackItem.pack_id == pack_id)
+        .group_by(ItemCategory.id, Category.id, Category.name, ItemCategory.sort_order)
+        .order_by(ItemCategory.sort_order.asc().nullslast(), ItemCategory.id)).all()
+
+    totals = ("total", "base", "worn", "consumable")
+    categories = [{
+        "category": {"id": row.id, "category_id": row.category_id, "name": row.name},
+        "items": row.items,
+        **{key: round(float(getattr(row, key)), 2) for key in totals}
+    } for row in rows]
+
+    return {
+        "pack_id": pack_id,
+        "unit": unit,
+        "items": sum(category["items"] for category in categories),
+        **{key: round(sum(category[key] for category in categories), 2) for key in totals},
+        "categories": categories
+    }
+
+
+def invalidate_pack_summaries(user_id, pack_id=None):
+    """Drop cached summaries for one pack, or for all of a user's packs."""
+    if pack_id is None:
+        summary_cache.invalidate_where(lambda key, value: key[0] == user_id)
+    else:
+        summary_cache.invalidate((user_id, int(pack_id)))
+
+
+def compare_packs(session, pack_a, pack_b, unit):
+    """Diff two packs' items with a single FULL OUTER JOIN over pack items.
+
+    :return: dict of added/removed/changed items and weight deltas per category
+    """
+    a = select(PackItem).where(PackItem.pack_id == pack_a).subquery("a")
+    b = select(PackItem).where(PackItem.pack_id == pack_b).subquery("b")
+    item_id = func.coalesce(a.c.item_id, b.c.item_id)
+    weight = Item.weight * conversion_factor_expr(Item.unit, unit)
+
+    def side_weight(side):
+        return case((side.c.item_id == None, 0),
+                    else_=func.coalesce(weight * func.coalesce(side.c.quantity, 1), 0))
+
+    status = case((a.c.item_id == None, "added"),
+                  (b.c.item_id == None, "removed"),
+                  else_="changed")
+
+    rows = session.execute(
+        select(item_id.label("item_id"), status.label("status"), Item.name,
+               ItemCategory.id.label("category_id"), Category.name.label("category"),
+               a.c.quantity.label("quantity_a"), b.c.quantity.label("quantity_b"),
+               a.c.worn.label("worn_a"), b.c.worn.label("worn_b"),
+               (side_weight(b) - side_weight(a)).label("delta"))
+        .select_from(a.join(b, a.c.item_id == b.c.item_id, full=True))
+        .join(Item, Item.id == item_id)
+        .outerjoin(ItemCategory, ItemCategory.id == Item.category_id)
+        .outerjoin(Category, Category.id == ItemCategory.category_id)
+        .where(or_(a.c.item_id == None, b.c.item_id == None,
+                   a.c.quantity.is_distinct_from(b.c.quantity),
+                   a.c.worn.is_distinct_from(b.c.worn)))
+        .order_by(ItemCategory.sort_order.asc().nullslast(), Item.name)).all()
+
+    result = {"a": pack_a, "b": pack_b, "unit": unit,
+              "added": [], "removed": [], "changed": []}
+    categories = {}
+    for row in rows:
+        entry = row._asdict()
+        entry["delta"] = round(float(entry["delta"]), 2)
+        result[entry.pop("status")].append(entry)
+
+        category = categories.setdefault(row.category_id, {
+            "category": {"id": row.category_id, "name": row.category}, "delta": 0})
+        category["delta"] = round(category["delta"] + entry["delta"], 2)
+
+    result["categories"] = list(categories.values())
+    result["delta"] = round(sum(c["delta"] for c in categories.values()), 2)
+    return result
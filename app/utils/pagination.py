@@ -0,0 +1,101 @@
+import base64
+import datetime
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import inspect, select, tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row into an opaque token."""
+    values = [{"dt": v.isoformat()} if isinstance(v, datetime.datetime) else v
+              for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        values = [datetime.datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v
+                  for v in values]
+    except Exception:
+        raise HTTPException(400, "Invalid cursor.")
+
+    if len(values) != size:
+        raise HTTPException(400, "Invalid cursor.")
+
+    return values
+
+
+def project(model, fields):
+    """Return the columns named in a comma-separated `fields` string, or None for all."""
+    if not fields:
+        return None
+
+    attrs = {attr.key: getattr(model, attr.key)
+             for attr in inspect(model).column_attrs}
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in attrs]
+    if unknown:
+        raise HTTPException(400, f"Unknown fields: {', '.join(unknown)}")
+
+    return [attrs[name] for name in names]
+
+
+def page_size(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+
+    if limit < 1:
+        raise HTTPException(400, "Limit must be positive.")
+
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_page(session, model, where, order_by, cursor=None, limit=None, fields=None, descending=False,
+                options=()):
+    """Fetch one page of `model` rows using keyset pagination.
+
+    :param where: filter clauses for the listing
+    :param order_by: expressions forming a unique sort key, e.g. [Item.id]
+    :param cursor: token returned as `next_cursor` by the previous page
+    :param fields: optional comma-separated column names to select
+    :param options: loader options applied when whole rows are selected
+    :return: dict with the page `data`, `next_cursor` (None on the last page) and `limit`
+    """
+    limit = page_size(limit)
+    columns = project(model, fields)
+    keys = [expr.label(f"_key{i}") for i, expr in enumerate(order_by)]
+
+    stmt = select(*(columns or [model]), *keys).where(*where)
+    if not columns:
+        stmt = stmt.options(*options)
+    if cursor:
+        values = decode_cursor(cursor, len(order_by))
+        key = tuple_(*order_by)
+        stmt = stmt.where(key < tuple(values) if descending else key > tuple(values))
+
+    stmt = stmt.order_by(*[expr.desc() if descending else expr for expr in order_by]) \
+        .limit(limit + 1)
+    rows = session.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][-len(keys):]))
+
+    if columns:
+        data = [dict(zip([c.key for c in columns], row[:len(columns)]))
+                for row in rows]
+    else:
+        data = [row[0] for row in rows]
+
+    return {"data": data, "next_cursor": next_cursor, "limit": limit}
+
+
+def paginated(cursor, limit, fields):
+    """True when a listing request opted into pagination or projection."""
+    return cursor is not None or limit is not None or fields is not None
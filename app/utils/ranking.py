@@ -0,0 +1,110 @@
+from fastapi import HTTPException
+from sqlalchemy import Integer, column, func, select, tuple_, update, values
+
+# Spacing between neighbours after a rebalance; about ten moves into the same
+# slot fit before the list needs spreading out again.
+RANK_GAP = 1024
+MAX_RANK = 2 ** 31 - 1
+
+
+def set_sort_orders(session, model, where, orders):
+    """Apply (id, sort_order) pairs with a single UPDATE ... FROM (VALUES ...).
+
+    :param where: clauses limiting which rows may be updated, e.g. ownership
+    """
+    if not orders:
+        return
+
+    new_order = values(column("id", Integer), column("sort_order", Integer),
+                       name="new_order").data([tuple(order) for order in orders])
+    session.execute(update(model)
+                    .where(model.id == new_order.c.id, *where)
+                    .values(sort_order=new_order.c.sort_order)
+                    .execution_options(synchronize_session=False))
+
+
+def spaced(orders):
+    """Scale (id, position) pairs from the full-list sort endpoints to RANK_GAP-spaced ranks.
+
+    Those clients send contiguous positions; spacing them keeps later moves
+    into the list from having to rebalance it first.
+    """
+    return [(row_id, position * RANK_GAP) for row_id, position in orders]
+
+
+def next_rank(session, model, where):
+    """Rank placing a new row after every ranked row in `where`."""
+    last = session.scalar(select(func.max(model.sort_order)).where(*where))
+    return (last or 0) + RANK_GAP
+
+
+def rebalance(session, model, where):
+    """Spread the rows in `where` evenly, RANK_GAP apart, keeping their order."""
+    ids = session.scalars(select(model.id).where(*where).order_by(
+        model.sort_order.asc().nullslast(), model.id)).all()
+    set_sort_orders(session, model, where, [
+                    (row_id, (i + 1) * RANK_GAP) for i, row_id in enumerate(ids)])
+
+
+def neighbour_rank(session, model, where, anchor, moved_id, after):
+    """Rank of the row directly after (or before) `anchor`, ignoring the moved row."""
+    key = tuple_(model.sort_order, model.id)
+    anchor_key = (anchor.sort_order, anchor.id)
+    stmt = select(model.sort_order).where(
+        *where, model.id != moved_id, model.sort_order != None,
+        key > anchor_key if after else key < anchor_key)
+    if after:
+        stmt = stmt.order_by(model.sort_order, model.id)
+    else:
+        stmt = stmt.order_by(model.sort_order.desc(), model.id.desc())
+    return session.scalar(stmt.limit(1))
+
+
+def free_rank(session, model, where, anchor, moved_id, after):
+    """Return a rank strictly between `anchor` and its neighbour, or None if there is no gap."""
+    if anchor.sort_order is None:
+        return None
+
+    neighbour = neighbour_rank(session, model, where, anchor, moved_id, after)
+    if neighbour is None:
+        neighbour = anchor.sort_order + (2 * RANK_GAP if after else -2 * RANK_GAP)
+
+    if abs(neighbour - anchor.sort_order) < 2:
+        return None
+
+    rank = (anchor.sort_order + neighbour) // 2
+    return rank if -MAX_RANK <= rank <= MAX_RANK else None
+
+
+def move(session, model, where, moved_id, after_id=None, before_id=None):
+    """Move one row directly after or before another one.
+
+    Only the moved row is written, unless its neighbours have no gap left,
+    in which case the list is rebalanced first.
+
+    :return: the moved row's new sort_order
+    """
+    anchor_id = after_id if after_id is not None else before_id
+    if anchor_id is None or anchor_id == moved_id:
+        raise HTTPException(
+            400, "Provide an after_id or before_id other than the moved id.")
+
+    rank = None
+    for _ in range(2):
+        rows = {row.id: row for row in session.execute(select(model.id, model.sort_order).where(
+            *where, model.id.in_([moved_id, anchor_id])))}
+        if len(rows) < 2:
+            raise HTTPException(400, "Unable to find rows to reorder.")
+
+        rank = free_rank(session, model, where,
+                         rows[anchor_id], moved_id, after_id is not None)
+        if rank is not None:
+            break
+
+        rebalance(session, model, where)
+
+    session.execute(update(model)
+                    .where(model.id == moved_id, *where)
+                    .values(sort_order=rank)
+                    .execution_options(synchronize_session=False))
+    return rank
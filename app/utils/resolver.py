@@ -0,0 +1,165 @@
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from models.base import Brand, Product, ProductVariant, Category, ItemCategory
+from utils.ranking import RANK_GAP, next_rank
+
+
+def unique_names(names):
+    """Map lower-cased, stripped names to their first spelling."""
+    wanted = {}
+    for name in names:
+        if name and name.strip():
+            wanted.setdefault(name.strip().lower(), name.strip())
+    return wanted
+
+
+def rows_to_map(rows):
+    """Turn (key..., id) rows into a {key: id} dict; compound keys become tuples."""
+    return {(row[0] if len(row) == 2 else tuple(row[:-1])): row[-1] for row in rows}
+
+
+def resolve(session, model, wanted, lookup, returning, build):
+    """Resolve keys in one query and create the missing ones in one bulk insert.
+
+    :param wanted: dict of key -> display value to resolve
+    :param lookup: callable returning a select of (key..., id) for the given keys
+    :param returning: columns matching `lookup`, returned by the insert
+    :param build: callable turning (key, display value) into an insert row
+    :return: dict of key -> id
+    """
+    if not wanted:
+        return {}
+
+    keys = list(wanted.keys())
+    found = rows_to_map(session.execute(lookup(keys)).all())
+    missing = [key for key in keys if key not in found]
+    if not missing:
+        return found
+
+    stmt = insert(model).values([build(key, wanted[key]) for key in missing]) \
+        .on_conflict_do_nothing().returning(*returning)
+    found.update(rows_to_map(session.execute(stmt).all()))
+
+    # Rows created concurrently were skipped by ON CONFLICT; pick them up
+    missing = [key for key in missing if key not in found]
+    if missing:
+        found.update(rows_to_map(session.execute(lookup(missing)).all()))
+
+    return found
+
+
+def resolve_brands(session, names):
+    """Return {lower name: brand id}, creating missing brands."""
+    lower_name = func.lower(Brand.name)
+    return resolve(session, Brand, unique_names(names),
+                   lambda keys: select(lower_name, Brand.id).where(
+                       lower_name.in_(keys)),
+                   (lower_name, Brand.id),
+                   lambda key, name: dict(name=name))
+
+
+def resolve_products(session, products):
+    """Return {(brand id, lower name): product id} for (brand id, name) pairs."""
+    wanted = {}
+    for brand_id, name in products:
+        if brand_id and name and name.strip():
+            wanted.setdefault((brand_id, name.strip().lower()), name.strip())
+
+    lower_name = func.lower(Product.name)
+    return resolve(session, Product, wanted,
+                   lambda keys: select(Product.brand_id, lower_name, Product.id).where(
+                       tuple_(Product.brand_id, lower_name).in_(keys)),
+                   (Product.brand_id, lower_name, Product.id),
+                   lambda key, name: dict(brand_id=key[0], name=name))
+
+
+def resolve_variants(session, variants):
+    """Return {(product id, lower name): variant id} for (product id, name) pairs."""
+    wanted = {}
+    for product_id, name in variants:
+        if product_id and name and name.strip():
+            wanted.setdefault((product_id, name.strip().lower()), name.strip())
+
+    lower_name = func.lower(ProductVariant.name)
+    return resolve(session, ProductVariant, wanted,
+                   lambda keys: select(ProductVariant.product_id, lower_name, ProductVariant.id).where(
+                       tuple_(ProductVariant.product_id, lower_name).in_(keys)),
+                   (ProductVariant.product_id, lower_name, ProductVariant.id),
+                   lambda key, name: dict(product_id=key[0], name=name))
+
+
+def resolve_categories(session, names, user_id):
+    """Return {lower name: category id} among the user's and generic categories."""
+    lower_name = func.lower(Category.name)
+
+    def lookup(keys):
+        # Generic categories sort first so the user's own categories win
+        return select(lower_name, Category.id).where(
+            or_(Category.user_id == user_id, Category.user_id == None),
+            lower_name.in_(keys)).order_by(Category.user_id.nullsfirst())
+
+    return resolve(session, Category, unique_names(names), lookup,
+                   (lower_name, Category.id),
+                   lambda key, name: dict(name=name, user_id=user_id))
+
+
+def resolve_item_categories(session, category_ids, user_id):
+    """Return {category id: item category id}, appending missing ones to the user's order."""
+    wanted = {category_id: category_id for category_id in category_ids if category_id}
+    position = []
+
+    def build(key, category_id):
+        if not position:
+            position.append(next_rank(session, ItemCategory, [ItemCategory.user_id == user_id]))
+        else:
+            position[0] += RANK_GAP
+        return dict(category_id=category_id, user_id=user_id, sort_order=position[0])
+
+    return resolve(session, ItemCategory, wanted,
+                   lambda keys: select(ItemCategory.category_id, ItemCategory.id).where(
+                       ItemCategory.user_id == user_id, ItemCategory.category_id.in_(keys)),
+                   (ItemCategory.category_id, ItemCategory.id),
+                   build)
+
+
+def resolve_item_payloads(session, payloads, user_id):
+    """Fill in brand, product, variant and category ids on item payloads.
+
+    `*_new` names are resolved or created for all payloads at once, and category
+    ids are swapped for the user's item category ids. Nothing is committed, so
+    created rows commit together with the caller's items.
+    """
+    brands = resolve_brands(session, [p.brand_new for p in payloads])
+    for p in payloads:
+        if p.brand_new:
+            p.brand_id = brands.get(p.brand_new.strip().lower(), p.brand_id)
+
+    products = resolve_products(
+        session, [(p.brand_id, p.product_new) for p in payloads if p.product_new])
+    for p in payloads:
+        if p.product_new and p.brand_id:
+            p.product_id = products.get(
+                (p.brand_id, p.product_new.strip().lower()), p.product_id)
+
+    variants = resolve_variants(
+        session, [(p.product_id, p.product_variant_new) for p in payloads if p.product_variant_new])
+    for p in payloads:
+        if p.product_variant_new and p.product_id:
+            p.product_variant_id = variants.get(
+                (p.product_id, p.product_variant_new.strip().lower()), p.product_variant_id)
+
+    categories = resolve_categories(
+        session, [p.category_new for p in payloads], user_id)
+    for p in payloads:
+        if p.category_new:
+            p.category_id = categories.get(
+                p.category_new.strip().lower(), p.category_id)
+
+    item_categories = resolve_item_categories(
+        session, [p.category_id for p in payloads], user_id)
+    for p in payloads:
+        if p.category_id:
+            p.category_id = item_categories[p.category_id]
+
+    return payloads
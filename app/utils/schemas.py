@@ -0,0 +1,92 @@
+import datetime
+
+from pydantic import BaseModel
+from sqlalchemy.orm import selectinload
+from typing import List
+
+from models.base import Pack, PackItem, Item, ItemCategory
+
+
+class BrandSchema(BaseModel):
+    id: int
+    name: str = None
+
+    class Config:
+        orm_mode = True
+
+
+class CategorySchema(BaseModel):
+    id: int
+    name: str = None
+    user_id: int = None
+
+    class Config:
+        orm_mode = True
+
+
+class ItemCategorySchema(BaseModel):
+    id: int
+    category_id: int = None
+    user_id: int = None
+    sort_order: int = None
+    category: CategorySchema = None
+
+    class Config:
+        orm_mode = True
+
+
+class ItemSchema(BaseModel):
+    id: int
+    user_id: int = None
+    name: str = None
+    brand_id: int = None
+    product_id: int = None
+    product_variant_id: int = None
+    category_id: int = None
+    weight: float = None
+    unit: str = None
+    price: float = None
+    consumable: bool = None
+    product_url: str = None
+    wishlist: bool = None
+    notes: str = None
+    sort_order: int = None
+    removed: bool = None
+    brand: BrandSchema = None
+    category: ItemCategorySchema = None
+
+    class Config:
+        orm_mode = True
+
+
+class PackItemSchema(BaseModel):
+    pack_id: int
+    item_id: int
+    quantity: float = None
+    worn: bool = None
+    checked: bool = None
+    sort_order: int = None
+    item: ItemSchema = None
+
+    class Config:
+        orm_mode = True
+
+
+class PackSchema(BaseModel):
+    id: int
+    title: str = None
+    trip_id: int = None
+    user_id: int = None
+    created_at: datetime.datetime = None
+    updated_at: datetime.datetime = None
+    items: List[PackItemSchema] = []
+
+    class Config:
+        orm_mode = True
+
+
+def pack_loader_options():
+    """Load the pack -> pack items -> item -> category/brand graph in a fixed number of queries."""
+    item = selectinload(Pack.items).selectinload(PackItem.item)
+    return [item.selectinload(Item.category).selectinload(ItemCategory.category),
+            item.selectinload(Item.brand)]
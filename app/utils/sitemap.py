@@ -0,0 +1,117 @@
+import gzip
+import json
+import threading
+import zlib
+
+from collections import Counter
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models.base import Trip
+from utils.cache import TTLCache
+
+# Trips are split into chunks by id range, so an edit only touches one chunk
+SITEMAP_CHUNK_SIZE = 1000
+
+# Gzipped chunk documents keyed by chunk number, plus the index under 'index'
+sitemap_cache = TTLCache('sitemap', maxsize=512, ttl=3600)
+
+# Bumped per cache key on invalidation, so documents read before it are not cached
+_generations = Counter()
+_lock = threading.Lock()
+
+
+def published_trips():
+    return select(Trip.id, Trip.title, Trip.updated_at).where(
+        Trip.removed == False, Trip.published == True)
+
+
+def chunk_of(trip_id):
+    return int(trip_id) // SITEMAP_CHUNK_SIZE
+
+
+def sitemap_index(session):
+    """List non-empty chunks with their trip count and latest update."""
+    index = sitemap_cache.get('index')
+    if index is None:
+        generation = _generations['index']
+        chunk = (Trip.id // SITEMAP_CHUNK_SIZE).label("chunk")
+        rows = session.execute(
+            select(chunk, func.count().label("trips"), func.max(Trip.updated_at).label("updated_at"))
+            .where(Trip.removed == False, Trip.published == True)
+            .group_by(chunk).order_by(chunk)).all()
+        index = [row._asdict() for row in rows]
+        store('index', index, generation)
+    return index
+
+
+def chunk_pieces(bind, chunk):
+    """Yield a chunk's JSON array piece by piece from a server-side cursor."""
+    start = chunk * SITEMAP_CHUNK_SIZE
+    stmt = published_trips() \
+        .where(Trip.id >= start, Trip.id < start + SITEMAP_CHUNK_SIZE) \
+        .order_by(Trip.id) \
+        .execution_options(yield_per=200)
+
+    with Session(bind) as session:
+        yield "["
+        separator = ""
+        for partition in session.execute(stmt).partitions():
+            for trip in partition:
+                yield separator + json.dumps(trip._asdict(), default=str)
+                separator = ","
+        yield "]"
+
+
+def stream_chunk(bind, chunk, gzip_output):
+    """Stream a chunk, gzipping on the fly, and cache the gzipped document once complete."""
+    generation = _generations[chunk]
+    compressor = zlib.compressobj(wbits=31)
+    compressed = []
+    for piece in chunk_pieces(bind, chunk):
+        data = piece.encode()
+        part = compressor.compress(data)
+        compressed.append(part)
+        yield part if gzip_output else data
+
+    tail = compressor.flush()
+    compressed.append(tail)
+    if gzip_output:
+        yield tail
+
+    store(chunk, b"".join(compressed), generation)
+
+
+def store(key, document, generation):
+    # Skip documents read before the most recent invalidation of their key
+    with _lock:
+        if generation == _generations[key]:
+            sitemap_cache.set(key, document)
+
+
+def accepts_gzip(request):
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+
+def chunk_response(request, bind, chunk):
+    gzip_output = accepts_gzip(request)
+    headers = {"Vary": "Accept-Encoding"}
+    if gzip_output:
+        headers["Content-Encoding"] = "gzip"
+
+    cached = sitemap_cache.get(chunk)
+    if cached is not None:
+        content = cached if gzip_output else gzip.decompress(cached)
+        return Response(content=content, media_type="application/json", headers=headers)
+
+    return StreamingResponse(stream_chunk(bind, chunk, gzip_output),
+                             media_type="application/json", headers=headers)
+
+
+def invalidate_sitemap(trip_id):
+    with _lock:
+        for key in (chunk_of(trip_id), 'index'):
+            _generations[key] += 1
+            sitemap_cache.invalidate(key)
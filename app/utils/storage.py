@@ -0,0 +1,139 @@
+import datetime
+import threading
+
+from fastapi_sqlalchemy import db
+from sqlalchemy import Column, DateTime, Integer, String, bindparam, delete, insert, select, update
+
+from models.base import Base
+from utils.consts import STORAGE_GC_INTERVAL, STORAGE_GC_MAX_ATTEMPTS
+from utils.digital_ocean import s3_files_delete
+
+# delete_objects accepts at most this many keys per request
+DELETE_BATCH_SIZE = 1000
+MAX_RETRY_DELAY = datetime.timedelta(hours=1)
+
+
+class StorageDeletion(Base):
+    __tablename__ = 'storage_deletion'
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    not_before = Column(DateTime, nullable=False, index=True,
+                        default=datetime.datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+_wakeup = threading.Event()
+_worker = []
+
+
+def image_keys(image):
+    """Every stored object belonging to an Image row."""
+    s3 = image.s3 or {}
+    keys = [variant['key'] for variant in s3.get('variants', [])]
+    if s3.get('upload_key'):
+        keys.append(s3['upload_key'])
+    if s3.get('key'):
+        # Processed images record the keys of their fallback rendition and thumbnail
+        keys += [key for key in (s3['key'], s3.get('thumb_key')) if key]
+    elif s3.get('extension'):
+        keys.append(image.s3_key)
+        if not image.avatar:
+            keys.append(image.s3_key_thumb)
+    return keys
+
+
+def enqueue_deletion(session, keys, not_before=None):
+    """Queue objects for deletion as part of the caller's transaction.
+
+    :param not_before: keep the objects until then; defaults to now
+    """
+    keys = [key for key in keys if key]
+    if keys:
+        not_before = not_before or datetime.datetime.utcnow()
+        session.execute(insert(StorageDeletion), [{"key": key, "not_before": not_before} for key in keys])
+    return len(keys)
+
+
+def cancel_deletion(session, key):
+    """Take a key whose deletion is scheduled for later back out of the queue.
+
+    Entries already due or being retried are left alone. Nothing is committed here.
+
+    :return: True if a scheduled deletion was cancelled
+    """
+    return session.execute(
+        delete(StorageDeletion).where(
+            StorageDeletion.key == key,
+            StorageDeletion.attempts == 0,
+            StorageDeletion.not_before > datetime.datetime.utcnow())
+        .returning(StorageDeletion.id)).first() is not None
+
+
+def notify_storage_gc():
+    _wakeup.set()
+
+
+def retry_delay(attempts):
+    return min(datetime.timedelta(seconds=30 * 2 ** attempts), MAX_RETRY_DELAY)
+
+
+def collect_garbage(session):
+    """Delete one batch of due objects and reschedule the ones that failed.
+
+    :return: number of queued keys processed
+    """
+    now = datetime.datetime.utcnow()
+    rows = session.execute(
+        select(StorageDeletion.id, StorageDeletion.key, StorageDeletion.attempts)
+        .where(StorageDeletion.not_before <= now,
+               StorageDeletion.attempts < STORAGE_GC_MAX_ATTEMPTS)
+        .order_by(StorageDeletion.id)
+        .limit(DELETE_BATCH_SIZE)
+        .with_for_update(skip_locked=True)).all()
+    if not rows:
+        session.commit()
+        return 0
+
+    failed = s3_files_delete(list({row.key for row in rows}))
+
+    done = [row.id for row in rows if row.key not in failed]
+    if done:
+        session.execute(delete(StorageDeletion).where(StorageDeletion.id.in_(done)))
+    retries = [dict(match_id=row.id, new_attempts=row.attempts + 1,
+                    new_not_before=now + retry_delay(row.attempts),
+                    new_last_error=failed[row.key])
+               for row in rows if row.key in failed]
+    if retries:
+        table = StorageDeletion.__table__
+        session.execute(update(table).where(table.c.id == bindparam("match_id")).values(
+            attempts=bindparam("new_attempts"),
+            not_before=bindparam("new_not_before"),
+            last_error=bindparam("new_last_error")), retries)
+
+    session.commit()
+    return len(rows)
+
+
+def run_storage_gc():
+    while True:
+        try:
+            with db():
+                # Keep going while full batches come back
+                while collect_garbage(db.session) == DELETE_BATCH_SIZE:
+                    pass
+        except Exception as e:
+            print(e)
+
+        _wakeup.wait(STORAGE_GC_INTERVAL)
+        _wakeup.clear()
+
+
+def start_storage_gc():
+    """Start the background deletion worker once per process."""
+    if not _worker:
+        worker = threading.Thread(target=run_storage_gc, name='storage-gc', daemon=True)
+        _worker.append(worker)
+        worker.start()
@@ -0,0 +1,76 @@
+import datetime
+
+from sqlalchemy import select, update
+
+from models.base import Item, ItemCategory, Pack, PackItem, Trip
+from utils.pagination import encode_cursor, decode_cursor
+
+# Rows committed shortly after a token was issued may carry an earlier
+# updated_at; re-sending this window keeps them from being skipped.
+SYNC_OVERLAP = datetime.timedelta(seconds=5)
+
+
+def touch_pack(session, pack_id):
+    """Mark a pack as changed after writes that only touch its pack items."""
+    session.execute(update(Pack).where(Pack.id == pack_id).values(
+        updated_at=datetime.datetime.utcnow()))
+
+
+def touch_trip(session, trip_id):
+    """Mark a trip as changed after writes that only touch its images, conditions or geographies."""
+    session.execute(update(Trip).where(Trip.id == trip_id).values(
+        updated_at=datetime.datetime.utcnow()))
+
+
+def issue_token():
+    return encode_cursor([datetime.datetime.utcnow()])
+
+
+def token_time(token):
+    if not token:
+        return None
+    return decode_cursor(token, 1)[0] - SYNC_OVERLAP
+
+
+def changed(session, model, user_id, since):
+    stmt = select(model).where(model.user_id == user_id)
+    if since:
+        stmt = stmt.where(model.updated_at > since)
+    return session.scalars(stmt).all()
+
+
+def current_ids(session, model, user_id):
+    return session.scalars(select(model.id).where(model.user_id == user_id)).all()
+
+
+def split_removed(rows):
+    """Split soft-deletable rows into (upserts, tombstone ids)."""
+    return [row for row in rows if not row.removed], [row.id for row in rows if row.removed]
+
+
+def fetch_changes(session, user_id, since=None):
+    """Collect everything that changed for a user since `since` (all rows when None).
+
+    Packs are returned whole with their current pack items, since writes to a
+    pack's items bump the pack's updated_at and pack items are hard-deleted.
+    Packs and item categories are hard-deleted too, so the ids of every one
+    that still exists are sent for clients to prune the rest.
+    """
+    items, removed_items = split_removed(
+        changed(session, Item, user_id, since))
+    trips, removed_trips = split_removed(
+        changed(session, Trip, user_id, since))
+    packs = changed(session, Pack, user_id, since)
+
+    pack_ids = [pack.id for pack in packs]
+    pack_items = session.scalars(select(PackItem).where(
+        PackItem.pack_id.in_(pack_ids))).all() if pack_ids else []
+
+    return {
+        "items": {"upserts": items, "removed": removed_items},
+        "item_categories": {"upserts": changed(session, ItemCategory, user_id, since),
+                            "ids": current_ids(session, ItemCategory, user_id)},
+        "packs": {"upserts": packs, "ids": current_ids(session, Pack, user_id)},
+        "pack_items": {"upserts": pack_items, "pack_ids": pack_ids},
+        "trips": {"upserts": trips, "removed": removed_trips}
+    }
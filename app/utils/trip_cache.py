@@ -0,0 +1,36 @@
+from utils.cache import TTLCache
+from utils.feed import invalidate_feed
+from utils.pack import invalidate_pack_summaries
+from utils.sitemap import invalidate_sitemap
+
+# Serialized public trip pages of published trips, keyed by trip uuid
+info_cache = TTLCache('trip_info', maxsize=1024, ttl=600)
+
+
+def invalidate_trip_info(trip_id=None, user_id=None):
+    """Drop cached trip pages for a trip, or for every trip owned by a user."""
+    if trip_id is not None:
+        info_cache.invalidate_where(
+            lambda key, value: value["trip_id"] == int(trip_id))
+    if user_id is not None:
+        info_cache.invalidate_where(
+            lambda key, value: value["user_id"] == user_id)
+
+
+def invalidate_trip_caches(trip_id):
+    """Drop every public, cached view of a trip after it changes."""
+    invalidate_feed()
+    invalidate_sitemap(trip_id)
+    invalidate_trip_info(trip_id=trip_id)
+
+
+def invalidate_user_caches(user_id):
+    """Drop cached views derived from a user's items, categories or units."""
+    invalidate_pack_summaries(user_id)
+    invalidate_trip_info(user_id=user_id)
+
+
+def invalidate_pack_caches(user_id, pack_id):
+    """Drop cached views showing a pack after it or its items change."""
+    invalidate_pack_summaries(user_id, pack_id)
+    invalidate_trip_info(user_id=user_id)
@@ -0,0 +1,121 @@
+import datetime
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from fastapi_sqlalchemy import db
+
+from models.base import Image
+from utils.auth import invalidate_user
+from utils.consts import IMAGE_WORKERS, UPLOAD_FINALIZE_WINDOW, UPLOAD_MAX_SIZE, UPLOAD_URL_EXPIRY
+from utils.assets import store_image
+from utils.digital_ocean import s3_presigned_post, s3_file_download, s3_file_size
+from utils.storage import cancel_deletion, enqueue_deletion, notify_storage_gc
+from utils.sync import touch_trip
+from utils.trip_cache import invalidate_trip_info
+
+# Originals uploaded straight to the bucket wait here until they are processed
+UPLOAD_PREFIX = 'uploads'
+UPLOAD_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS,
+                              thread_name_prefix='image')
+
+
+def presign_upload(session, user_id, content_type):
+    """Sign a direct upload of one original image for a user.
+
+    The original is queued for deletion once the finalize window has passed,
+    so uploads that are never finalized do not linger in the bucket.
+    """
+    if content_type not in UPLOAD_CONTENT_TYPES:
+        raise HTTPException(400, "Unsupported image type.")
+
+    key = f"{UPLOAD_PREFIX}/{user_id}/{uuid.uuid4().hex}"
+    form = s3_presigned_post(key, content_type, UPLOAD_MAX_SIZE, UPLOAD_URL_EXPIRY)
+    if not form:
+        raise HTTPException(400, "An error occurred while preparing upload.")
+
+    expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=UPLOAD_FINALIZE_WINDOW)
+    enqueue_deletion(session, [key], not_before=expires)
+    session.commit()
+
+    return {"key": key, "url": form["url"], "fields": form["fields"], "expires_in": UPLOAD_URL_EXPIRY}
+
+
+def check_upload(user_id, key):
+    """Make sure `key` was signed for this user and its upload has arrived."""
+    parts = key.split("/")
+    if len(parts) != 3 or parts[:2] != [UPLOAD_PREFIX, str(user_id)] or not s3_file_size(key):
+        raise HTTPException(400, "Upload not found.")
+
+
+def claim_upload(session, user_id, key):
+    """Check an upload and cancel its scheduled cleanup, so each key is finalized only once.
+
+    Concurrent claims of one key wait on its queue row; nothing is committed here.
+    """
+    check_upload(user_id, key)
+    if not cancel_deletion(session, key):
+        raise HTTPException(400, "Upload has already been finalized or has expired.")
+
+
+def pending_s3(entity, key):
+    # The extension is only known once the original has been decoded
+    return {'extension': None, 'entity': entity, 'status': 'processing', 'upload_key': key}
+
+
+def queue_processing(image_id, key):
+    executor.submit(process_upload, image_id, key)
+
+
+def process_upload(image_id, key):
+    """Turn an uploaded original into the image's renditions; runs in a background thread."""
+    try:
+        data = s3_file_download(key)
+        with db():
+            image = db.session.get(Image, image_id)
+            if image is None:
+                return
+
+            entity = image.s3['entity']
+            if data is None:
+                raise Exception(f"Upload {key} is missing.")
+
+            # The original is no longer needed once its renditions are stored.
+            # Background work waits for a free worker instead of being turned away.
+            enqueue_deletion(db.session, [key])
+            if entity == 'avatar':
+                # Only replaces the current avatar once processing has succeeded
+                image.avatar = True
+            if image.trip_id:
+                touch_trip(db.session, image.trip_id)
+            store_image(db.session, image, entity, data, timeout=None)
+            trip_id, user_id = image.trip_id, image.user_id
+    except Exception as e:
+        print(e)
+        mark_failed(image_id, key)
+        return
+
+    notify_storage_gc()
+    if entity == 'avatar':
+        invalidate_user(user_id)
+    else:
+        invalidate_trip_info(trip_id=trip_id)
+
+
+def mark_failed(image_id, key):
+    try:
+        with db(commit_on_exit=True):
+            image = db.session.get(Image, image_id)
+            if image is not None:
+                image.s3 = dict(image.s3, status='failed')
+                if image.trip_id:
+                    touch_trip(db.session, image.trip_id)
+            # Failed originals are not kept around for a retry
+            enqueue_deletion(db.session, [key])
+    except Exception as e:
+        print(e)
+        return
+
+    notify_storage_gc()
@@ -1,34 +1,53 @@
+from sqlalchemy import case, func
+
+# Define conversion factors
+CONVERSION_FACTORS = {
+    ("g", "kg"): 0.001,
+    ("g", "oz"): 0.03527396,
+    ("g", "lb"): 0.00220462,
+    ("kg", "g"): 1000,
+    ("kg", "oz"): 35.27396,
+    ("kg", "lb"): 2.20462,
+    ("oz", "g"): 28.34952,
+    ("oz", "kg"): 0.02834952,
+    ("oz", "lb"): 0.0625,
+    ("lb", "g"): 453.59237,
+    ("lb", "kg"): 0.45359237,
+    ("lb", "oz"): 16
+}
+
+
 def convert_weight(value, source_unit, target_unit):
     if source_unit == target_unit:
         return value
 
     float_value = float(value)
 
-    # Define conversion factors
-    conversion_factors = {
-        ("g", "kg"): 0.001,
-        ("g", "oz"): 0.03527396,
-        ("g", "lb"): 0.00220462,
-        ("kg", "g"): 1000,
-        ("kg", "oz"): 35.27396,
-        ("kg", "lb"): 2.20462,
-        ("oz", "g"): 28.34952,
-        ("oz", "kg"): 0.02834952,
-        ("oz", "lb"): 0.0625,
-        ("lb", "g"): 453.59237,
-        ("lb", "kg"): 0.45359237,
-        ("lb", "oz"): 16
-    }
-
     # Ensure the source and target units are valid
-    if (source_unit, target_unit) in conversion_factors:
-        conversion_factor = conversion_factors[(source_unit, target_unit)]
+    if (source_unit, target_unit) in CONVERSION_FACTORS:
+        conversion_factor = CONVERSION_FACTORS[(source_unit, target_unit)]
         converted_value = float_value * conversion_factor
         return converted_value
     else:
         raise Exception("Invalid source or target unit")
 
 
+def conversion_factor_expr(unit_column, target_unit):
+    """SQL expression for the factor converting `unit_column` to `target_unit`.
+
+    Evaluates to NULL for unknown units, so those weights drop out of sums.
+    """
+    factors = {source: factor for (source, target), factor in CONVERSION_FACTORS.items()
+               if target == target_unit}
+    factors[target_unit] = 1
+    return case(factors, value=func.lower(unit_column), else_=None)
+
+
+def preferred_unit(unit_weight):
+    """Display unit for a user's `unit_weight` preference."""
+    return "g" if unit_weight == "METRIC" else "oz"
+
+
 def standardize_weight_unit(unit: str):
     unit = unit.lower().strip()
     if unit == 'gram' or unit == 'grams':